@@ -0,0 +1,107 @@
+"""
+Генератор синтетических наборов вопросов в формате, который ожидает POST /api/upload.
+
+Пример:
+    python -m benchmarks.datasets --rows 100000 --extra-columns 3 --date-columns 1 -o /tmp/questions.xlsx
+"""
+import argparse
+import csv
+import random
+from datetime import date, timedelta
+
+# Слова для текстов вопросов и ответов (кириллица - как в реальных данных)
+WORDS = ('пациент', 'жалуется', 'боль', 'температура', 'анализ', 'крови', 'давление', 'препарат',
+         'дозировка', 'симптом', 'диагноз', 'лечение', 'врач', 'осмотр', 'неделя', 'утром',
+         'рекомендовано', 'обследование', 'головная', 'кашель', 'слабость', 'приём', 'терапия')
+TOPICS = ('Кардиология', 'Неврология', 'Терапия', 'Педиатрия', 'Эндокринология', 'Дерматология')
+
+
+def _text(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def generate_rows(rows, extra_columns=2, date_columns=1, duplicates=0, nulls=0, seed=42):
+    """
+    Возвращает (columns, генератор строк).
+    duplicates - сколько строк повторяют уже использованный question_id,
+    nulls - сколько строк с пустым обязательным полем (такой файл загрузка отклонит).
+    """
+    rnd = random.Random(seed)
+    columns = (['question_id', 'question_text', 'answer_text', 'topic']
+               + [f'field_{index}' for index in range(1, extra_columns + 1)]
+               + [f'date_{index}' for index in range(1, date_columns + 1)])
+    # Дубликат ссылается на одну из предыдущих строк, поэтому первую строку не трогаем
+    special = rnd.sample(range(1, rows), min(max(rows - 1, 0), duplicates + nulls))
+    duplicate_rows = set(special[:duplicates])
+    null_rows = set(special[duplicates:])
+
+    def iter_rows():
+        start = date(2024, 1, 1)
+        for index in range(rows):
+            question_id = index + 1
+            if index in duplicate_rows:
+                question_id = rnd.randint(1, index)
+            row = [
+                question_id,
+                None if index in null_rows else _text(rnd, rnd.randint(8, 40)) + '?',
+                _text(rnd, rnd.randint(15, 80)) + '.',
+                rnd.choice(TOPICS),
+            ]
+            row += [f'{rnd.choice(WORDS)}-{rnd.randint(1, 1000)}' for _ in range(extra_columns)]
+            row += [start + timedelta(days=rnd.randint(0, 730)) for _ in range(date_columns)]
+            yield row
+
+    return columns, iter_rows()
+
+
+def write_xlsx(path, columns, rows):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_csv(path, columns, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(columns)
+        for row in rows:
+            # Даты - в формате M/d/yyyy, как их сохраняет загрузка
+            writer.writerow([f'{value.month}/{value.day}/{value.year}' if isinstance(value, date) else value
+                             for value in row])
+
+
+def generate_file(path, rows, **options):
+    """
+    Пишет набор в .xlsx или .csv (по расширению path).
+    """
+    columns, data = generate_rows(rows, **options)
+    if path.endswith('.csv'):
+        write_csv(path, columns, data)
+    else:
+        write_xlsx(path, columns, data)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация синтетического набора вопросов')
+    parser.add_argument('-o', '--output', required=True, help='путь к файлу .xlsx или .csv')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--extra-columns', type=int, default=2, help='дополнительные текстовые колонки')
+    parser.add_argument('--date-columns', type=int, default=1, help='колонки с датами')
+    parser.add_argument('--duplicates', type=int, default=0, help='строки с повторным question_id')
+    parser.add_argument('--nulls', type=int, default=0, help='строки с пустым question_text')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generate_file(args.output, args.rows, extra_columns=args.extra_columns, date_columns=args.date_columns,
+                  duplicates=args.duplicates, nulls=args.nulls, seed=args.seed)
+    print(f'{args.output}: {args.rows} строк')
+
+
+if __name__ == '__main__':
+    main()
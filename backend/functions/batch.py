@@ -0,0 +1,126 @@
+from collections import defaultdict
+from models import Category, Question, db, question_categories
+
+# Максимальное количество изменений в одном пакете
+MAX_BATCH_SIZE = 1000
+
+
+def _validate_item(item):
+    """
+    Проверка одного элемента пакета. Возвращает текст ошибки или None.
+    """
+    if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+        return "Каждый элемент должен содержать целочисленное поле 'id'."
+    if 'version' in item and not isinstance(item['version'], int):
+        return "Поле 'version' должно быть целым числом."
+    if 'score' in item and item['score'] not in [0, 1, None]:
+        return "Поле 'score' может принимать только значения 0, 1 или null."
+    if 'category_ids' in item:
+        category_ids = item['category_ids']
+        if not isinstance(category_ids, list) or not all(isinstance(c, int) for c in category_ids):
+            return "Поле 'category_ids' должно быть списком целых чисел."
+    return None
+
+
+def apply_batch_update(updates):
+    """
+    Применяет оценки и категории для многих вопросов в текущей транзакции.
+    Версии увеличиваются одним UPDATE; для элементов с полем version - условно,
+    по паре (id, version), несовпавшие получают статус 'conflict'.
+    Оценки - по одному UPDATE ... WHERE id IN (...) на каждое значение score,
+    категории - по разнице с текущими связями (удаляются и добавляются только изменившиеся пары).
+    Возвращает результаты по каждому id (для обновлённых - с новой версией); коммит остаётся за вызывающим кодом.
+    """
+    results = {}
+    order = []  # Ключи результатов в порядке элементов запроса
+    valid = {}
+    for index, item in enumerate(updates):
+        error = _validate_item(item)
+        key = item['id'] if not error else f'#{index}'
+        if not error and item['id'] in valid:
+            error = 'Повторный id в пакете.'
+            key = f"{item['id']}#{index}"
+        order.append(key)
+        if error:
+            results[key] = {'id': item.get('id') if isinstance(item, dict) else None, 'status': 'error', 'error': error}
+        else:
+            valid[item['id']] = item
+
+    existing = set(db.session.scalars(db.select(Question.id).where(Question.id.in_(list(valid)))))
+    for question_id in valid:
+        if question_id not in existing:
+            results[question_id] = {'id': question_id, 'status': 'not_found'}
+    items = {question_id: item for question_id, item in valid.items() if question_id in existing}
+
+    # --- Версии: проверка и увеличение без блокировок ---
+    question = Question.__table__
+    # Новые версии возвращаются клиенту, чтобы следующий пакет можно было отправить без перечитывания
+    versions = {}
+    expected = {question_id: item['version'] for question_id, item in items.items() if 'version' in item}
+    if expected:
+        versions.update(db.session.execute(
+            question.update()
+            .where(db.tuple_(question.c.id, question.c.version).in_(list(expected.items())))
+            .values(version=question.c.version + 1)
+            .returning(question.c.id, question.c.version)
+        ).all())
+        for question_id in expected.keys() - versions.keys():
+            results[question_id] = {'id': question_id, 'status': 'conflict',
+                                    'error': 'Вопрос был изменён другим пользователем.'}
+            del items[question_id]
+    unchecked = [question_id for question_id in items if question_id not in expected]
+    if unchecked:
+        versions.update(db.session.execute(
+            question.update()
+            .where(question.c.id.in_(unchecked))
+            .values(version=question.c.version + 1)
+            .returning(question.c.id, question.c.version)
+        ).all())
+
+    # --- Оценки: один UPDATE на каждое значение score ---
+    ids_by_score = defaultdict(list)
+    for question_id, item in items.items():
+        if 'score' in item:
+            ids_by_score[item['score']].append(question_id)
+    for score, ids in ids_by_score.items():
+        db.session.execute(question.update().where(question.c.id.in_(ids)).values(score=score))
+
+    # --- Категории: diff с текущими связями ---
+    wanted = {question_id: set(item['category_ids']) for question_id, item in items.items() if 'category_ids' in item}
+    if wanted:
+        requested = set().union(*wanted.values())
+        known = set(db.session.scalars(db.select(Category.id).where(Category.id.in_(list(requested))))) if requested else set()
+
+        current = defaultdict(set)
+        rows = db.session.execute(
+            db.select(question_categories.c.question_id, question_categories.c.category_id)
+            .where(question_categories.c.question_id.in_(list(wanted)))
+        )
+        for question_id, category_id in rows:
+            current[question_id].add(category_id)
+
+        to_delete = []
+        to_insert = []
+        for question_id, category_ids in wanted.items():
+            # Несуществующие категории игнорируем, как и в PUT /api/questions/<id>
+            category_ids &= known
+            wanted[question_id] = category_ids
+            to_delete.extend((question_id, category_id) for category_id in current[question_id] - category_ids)
+            to_insert.extend({'question_id': question_id, 'category_id': category_id}
+                             for category_id in category_ids - current[question_id])
+
+        if to_delete:
+            db.session.execute(question_categories.delete().where(
+                db.tuple_(question_categories.c.question_id, question_categories.c.category_id).in_(to_delete)))
+        if to_insert:
+            db.session.execute(question_categories.insert(), to_insert)
+
+    for question_id, item in items.items():
+        result = {'id': question_id, 'status': 'updated', 'version': versions[question_id]}
+        if 'score' in item:
+            result['score'] = item['score']
+        if question_id in wanted:
+            result['category_ids'] = sorted(wanted[question_id])
+        results[question_id] = result
+
+    return [results[key] for key in order]
@@ -0,0 +1,114 @@
+import io
+import json
+import time
+from flask import current_app
+from models import db
+
+
+class BulkLoader:
+    """
+    Базовый загрузчик пачек строк в таблицу через executemany (insert().values()).
+    Работает на любой СУБД, используется для SQLite и как запасной вариант.
+    """
+    name = 'executemany'
+
+    def __init__(self, table, session=None):
+        self.table = table
+        self.session = session or db.session
+        self.rows = 0
+        self.elapsed = 0.0
+
+    def load(self, rows):
+        """
+        Записывает пачку строк (список словарей колонка -> значение) в текущей транзакции.
+        """
+        if not rows:
+            return
+        started = time.perf_counter()
+        self._write(rows)
+        self.elapsed += time.perf_counter() - started
+        self.rows += len(rows)
+
+    def _write(self, rows):
+        self.session.execute(self.table.insert(), rows)
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed) if self.elapsed else 0
+
+    def stats(self):
+        return {
+            'loader': self.name,
+            'rows': self.rows,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+        }
+
+
+def _copy_value(value):
+    """
+    Кодирование значения для текстового формата COPY.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    else:
+        value = str(value)
+    return (value.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+
+class CopyBulkLoader(BulkLoader):
+    """
+    Загрузчик для PostgreSQL: пачка уходит одним COPY FROM STDIN через psycopg2.
+    """
+    name = 'copy'
+
+    def _write(self, rows):
+        columns = list(rows[0])
+        connection = self.session.connection()
+        preparer = connection.dialect.identifier_preparer
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(row.get(col)) for col in columns))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        sql = 'COPY {} ({}) FROM STDIN'.format(
+            preparer.format_table(self.table),
+            ', '.join(preparer.quote(col) for col in columns),
+        )
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(sql, buffer)
+        finally:
+            cursor.close()
+
+
+# Доступные загрузчики и загрузчик по умолчанию для каждого диалекта
+LOADERS = {
+    BulkLoader.name: BulkLoader,
+    CopyBulkLoader.name: CopyBulkLoader,
+}
+DEFAULT_LOADERS = {
+    'postgresql': CopyBulkLoader.name,
+}
+
+
+def get_bulk_loader(table, session=None):
+    """
+    Возвращает загрузчик для таблицы.
+    Явный выбор - через конфиг BULK_LOADER ('copy' / 'executemany'), иначе по диалекту БД.
+    """
+    session = session or db.session
+    name = current_app.config.get('BULK_LOADER')
+    if not name:
+        dialect = session.get_bind().dialect.name
+        name = DEFAULT_LOADERS.get(dialect, BulkLoader.name)
+    return LOADERS[name](table, session)
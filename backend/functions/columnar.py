@@ -0,0 +1,175 @@
+import tempfile
+from flask import current_app, jsonify, send_file
+from models import Category, Dataset, Question, db, question_categories
+from functions.export import BASE_COLUMNS, export_filename
+from functions.metrics import phase_timer
+
+# Колоночные форматы экспорта: расширение файла и MIME-тип
+COLUMNAR_FORMATS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+}
+
+
+def columnar_available():
+    """
+    pyarrow указан в requirements.txt, но импортируется лениво: без него приложение запускается,
+    а колоночные форматы недоступны (501).
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _extra_types():
+    """
+    Типы дополнительных колонок, определённые при загрузке (Dataset.column_types).
+    Для данных, загруженных до их учёта, - пусто: такие колонки экспортируются строками.
+    """
+    dataset = Dataset.query.order_by(Dataset.id.desc()).first()
+    return (dataset.column_types if dataset else None) or {}
+
+
+def _json_value(name):
+    """
+    Значение ключа additional_data как JSON (а не текст ->>), чтобы типы не зависели от СУБД.
+    На SQLite json_extract отдаёт true как 1, поэтому там используется оператор -> (SQLite 3.38+).
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        path = '$."%s"' % name.replace('"', '\\"')
+        return db.type_coerce(Question.additional_data.op('->')(path), db.JSON)
+    return Question.additional_data[name]
+
+
+def _schema(pa, columns, extra_types):
+    """
+    Типизированная схема экспорта. Дополнительные колонки - по типам из extra_types, остальные - строки.
+    """
+    types = {
+        'question_id': pa.int64(),
+        'question_text': pa.string(),
+        'answer_text': pa.string(),
+        'score': pa.int8(),
+        'score_text': pa.string(),
+        'categories': pa.list_(pa.string()),
+    }
+    value_types = {'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_()}
+    return pa.schema([(name, types.get(name) or value_types.get(extra_types.get(name), pa.string()))
+                      for name in columns])
+
+
+def _score_text(score):
+    return 'Согласен' if score == 1 else ('Не согласен' if score == 0 else 'Не оценено')
+
+
+def _category_names(ids):
+    """
+    Имена категорий для пачки вопросов одним запросом.
+    """
+    names = {question_id: [] for question_id in ids}
+    rows = db.session.execute(
+        db.select(question_categories.c.question_id, Category.name)
+        .join(Category, Category.id == question_categories.c.category_id)
+        .where(question_categories.c.question_id.in_(ids))
+        .order_by(question_categories.c.question_id, Category.id)
+    )
+    for question_id, name in rows:
+        names[question_id].append(name)
+    return names
+
+
+def iter_record_batches(query, columns, batch_size=1000):
+    """
+    Генератор RecordBatch по batch_size строк.
+    Из БД читаются только нужные для columns поля (без ORM-объектов): тексты - только если запрошены,
+    дополнительные колонки - отдельными ключами additional_data, категории - одним запросом на пачку
+    и только если запрошены.
+    """
+    import pyarrow as pa
+
+    extra_types = _extra_types()
+    schema = _schema(pa, columns, extra_types)
+    extra = [name for name in columns if name not in BASE_COLUMNS]
+    fields = [Question.id]
+    if 'question_text' in columns:
+        fields.append(Question.question_text)
+    if 'answer_text' in columns:
+        fields.append(Question.answer_text)
+    with_score = 'score' in columns or 'score_text' in columns
+    if with_score:
+        fields.append(Question.score)
+    fields.extend(_json_value(name) for name in extra)
+
+    def to_batch(rows):
+        ids = [row[0] for row in rows]
+        data = {'question_id': ids}
+        position = 1
+        for name in ('question_text', 'answer_text'):
+            if name in columns:
+                data[name] = [row[position] for row in rows]
+                position += 1
+        if with_score:
+            scores = [row[position] for row in rows]
+            position += 1
+            data['score'] = scores
+            data['score_text'] = [_score_text(score) for score in scores]
+        for offset, name in enumerate(extra, start=position):
+            values = [row[offset] for row in rows]
+            if extra_types.get(name) not in ('int', 'float', 'bool'):
+                # Строковая колонка: значения приводятся так же, как в CSV
+                values = [None if value is None else str(value) for value in values]
+            data[name] = values
+        if 'categories' in columns:
+            names = _category_names(ids)
+            data['categories'] = [names[question_id] for question_id in ids]
+        return pa.RecordBatch.from_pydict({name: data[name] for name in columns}, schema=schema)
+
+    rows = []
+    for row in query.with_entities(*fields).yield_per(batch_size):
+        rows.append(row)
+        if len(rows) >= batch_size:
+            yield to_batch(rows)
+            rows = []
+    if rows:
+        yield to_batch(rows)
+
+
+def write_columnar(format_type, query, columns, output, batch_size=1000, progress=None):
+    """
+    Пишет экспорт в Parquet или Arrow IPC (file) пачками RecordBatch, без сборки всей таблицы в памяти.
+    progress(phase, rows) - необязательный колбэк прогресса. Возвращает число строк.
+    """
+    import pyarrow as pa
+
+    schema = _schema(pa, columns, _extra_types())
+    rows = 0
+    with phase_timer('export', f'write_{format_type}'):
+        if format_type == 'parquet':
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(output, schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_file(output, schema)
+        with writer:
+            for batch in iter_record_batches(query, columns, batch_size=batch_size):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+                if progress:
+                    progress('exporting', rows)
+    return rows
+
+
+def export_columnar(query, columns, format_type, filter_option, batch_size=1000):
+    """
+    Экспорт в Parquet / Arrow. Небольшие файлы собираются в памяти, большие - во временном файле.
+    """
+    try:
+        extension, mimetype = COLUMNAR_FORMATS[format_type]
+        output = tempfile.SpooledTemporaryFile(max_size=current_app.config['EXPORT_SPOOL_MAX_SIZE'])
+        write_columnar(format_type, query, columns, output, batch_size=batch_size)
+        output.seek(0)
+        return send_file(output, mimetype=mimetype, as_attachment=True,
+                         download_name=export_filename(filter_option, extension))
+    except Exception as e:
+        return jsonify({'error': f'Ошибка экспорта {format_type}: {str(e)}'}), 500
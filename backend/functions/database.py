@@ -0,0 +1,49 @@
+from flask import request
+from models import REPLICA_BIND, db
+
+
+def engine_options(config, uri):
+    """
+    Параметры create_engine для БД uri: SQLALCHEMY_ENGINE_OPTIONS, пул соединений (кроме SQLite)
+    и statement_timeout по умолчанию (PostgreSQL).
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if not uri.startswith('sqlite'):
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+            pool_pre_ping=config['DB_POOL_PRE_PING'],
+        )
+    if uri.startswith('postgresql') and config['DB_STATEMENT_TIMEOUT_MS']:
+        connect_args = dict(options.get('connect_args') or {})
+        connect_args['options'] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        options['connect_args'] = connect_args
+    return options
+
+
+def configure_database(app):
+    """
+    Настройка движков до db.init_app(app): параметры пула, реплика для чтения
+    (bind 'replica', см. RoutingSession) и statement_timeout для отдельных эндпоинтов.
+    Параметры пула и statement_timeout применяются и к основной БД, и к реплике.
+    """
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        # Flask-SQLAlchemy применяет SQLALCHEMY_ENGINE_OPTIONS только к основному движку,
+        # поэтому параметры реплики передаются в самом bind'е
+        app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}),
+                                          REPLICA_BIND: {'url': replica_url, **engine_options(app.config, replica_url)}}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI'])
+
+    timeouts = app.config['DB_STATEMENT_TIMEOUTS']
+    if not timeouts:
+        return
+
+    @app.before_request
+    def set_statement_timeout():
+        # SET LOCAL действует до конца транзакции, то есть до первого коммита в эндпоинте
+        timeout = timeouts.get(request.endpoint)
+        if timeout and db.session.get_bind().dialect.name == 'postgresql':
+            db.session.execute(db.text(f'SET LOCAL statement_timeout = {int(timeout)}'))
@@ -0,0 +1,207 @@
+import itertools
+import json
+import queue
+import select
+import threading
+import time
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+from models import db
+from functions.stats import get_stats, invalidate_stats
+
+# Канал PostgreSQL LISTEN/NOTIFY для событий об изменении вопросов
+CHANNEL = 'question_events'
+
+# Лимит payload у NOTIFY - 8000 байт; больше не отправляем, а шлём событие без подробностей
+MAX_PAYLOAD_BYTES = 7900
+
+# Сколько событий может ждать отправки одному клиенту, прежде чем он получит 'resync'
+CLIENT_QUEUE_SIZE = 1000
+
+# Пауза (сек) перед переподключением слушателя после ошибки соединения
+LISTENER_RETRY_DELAY = 5.0
+
+
+class EventBroker:
+    """
+    Раздача событий подписчикам (SSE-клиентам) внутри процесса воркера.
+    У каждого подписчика своя очередь; переполненная очередь заменяется событием 'resync'.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    @property
+    def client_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        subscription = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        """
+        Кладёт событие в очереди всех подписчиков в виде пары (порядковый номер, событие).
+        """
+        item = (next(self._ids), event)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(item)
+            except queue.Full:
+                # Клиент не успевает читать: пропущенные события заменяем командой перечитать данные
+                with subscription.mutex:
+                    subscription.queue.clear()
+                subscription.put_nowait((item[0], {'type': 'resync'}))
+
+
+broker = EventBroker()
+
+
+def _dispatch(event):
+    # Событие могло прийти из другого воркера: кэш статистики этого процесса устарел
+    invalidate_stats()
+    broker.publish(event)
+
+
+def _encode(event):
+    """
+    JSON события для NOTIFY. Слишком большие события урезаются до типа и признака truncated:
+    клиент в этом случае перечитывает данные сам.
+    """
+    payload = json.dumps(event, ensure_ascii=False, default=str)
+    if len(payload.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+        payload = json.dumps({'type': event['type'], 'truncated': True})
+    return payload
+
+
+def notify(event_type, **data):
+    """
+    Публикует событие об изменении данных. Вызывается до коммита текущей транзакции:
+    событие уходит клиентам только после успешного коммита и пропадает при откате.
+    PostgreSQL - через pg_notify (получат все воркеры), иначе - только в текущем процессе.
+    """
+    event = {'type': event_type, **data}
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(db.select(db.func.pg_notify(CHANNEL, _encode(event))))
+    else:
+        db.session.info.setdefault('pending_events', []).append(json.loads(_encode(event)))
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _send_pending_events(session):
+    for event in session.info.pop('pending_events', []):
+        _dispatch(event)
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _drop_pending_events(session):
+    session.info.pop('pending_events', None)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _listen(app):
+    """
+    Цикл слушателя: одно соединение LISTEN на процесс воркера, события раздаются через broker.
+    При обрыве соединения переподключается, а клиенты получают 'resync'.
+    """
+    while True:
+        connection = None
+        try:
+            with app.app_context():
+                raw = db.engine.raw_connection()
+            # Соединение живёт всё время работы воркера, поэтому забираем его из пула
+            raw.detach()
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                if select.select([connection], [], [], LISTENER_RETRY_DELAY) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    _dispatch(json.loads(notification.payload))
+        except Exception as e:
+            app.logger.warning('Слушатель событий %s: %s, переподключение', CHANNEL, e)
+            broker.publish({'type': 'resync'})
+            time.sleep(LISTENER_RETRY_DELAY)
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+def ensure_listener(app):
+    """
+    Запускает слушателя NOTIFY при первой подписке (для PostgreSQL).
+    Запуск ленивый, чтобы поток создавался в процессе воркера, а не до fork.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is None and db.engine.dialect.name == 'postgresql':
+            _listener = threading.Thread(target=_listen, args=(app,), name='events-listener', daemon=True)
+            _listener.start()
+
+
+def _format(event, sequence=None):
+    """
+    Событие в формате text/event-stream: тип события - в поле event, остальное - JSON в data.
+    """
+    data = {key: value for key, value in event.items() if key != 'type'}
+    lines = [f'id: {sequence}'] if sequence is not None else []
+    lines.append(f"event: {event['type']}")
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def iter_events(stats_ttl, heartbeat, stats_interval):
+    """
+    Поток SSE для одного клиента: сначала снимок статистики, затем события изменений.
+    После изменений клиенту отправляется свежая статистика, не чаще раза в stats_interval секунд.
+    Если событий нет, каждые heartbeat секунд отправляется комментарий, чтобы прокси не рвали соединение.
+    """
+
+    def stats_event():
+        stats = get_stats(stats_ttl)
+        # Не держим транзакцию открытой, пока поток ждёт событий
+        db.session.close()
+        return _format({'type': 'stats', **stats})
+
+    # Подписка внутри генератора: если клиент отключится до начала потока, подписка не останется висеть
+    subscription = broker.subscribe()
+    try:
+        yield f'retry: {int(LISTENER_RETRY_DELAY * 1000)}\n\n'
+        yield stats_event()
+        stats_sent_at = time.monotonic()
+        stats_dirty = False
+        while True:
+            timeout = heartbeat
+            if stats_dirty:
+                timeout = max(0.0, min(timeout, stats_sent_at + stats_interval - time.monotonic()))
+            try:
+                sequence, event = subscription.get(timeout=timeout)
+            except queue.Empty:
+                if not stats_dirty:
+                    yield ': heartbeat\n\n'
+            else:
+                yield _format(event, sequence)
+                stats_dirty = True
+            if stats_dirty and time.monotonic() - stats_sent_at >= stats_interval:
+                yield stats_event()
+                stats_sent_at = time.monotonic()
+                stats_dirty = False
+    finally:
+        broker.unsubscribe(subscription)
@@ -1,65 +1,175 @@
-import pandas as pd
+import csv
 import io
-from flask import send_file, jsonify
+import tempfile
+import time
+from flask import Response, current_app, send_file, jsonify, stream_with_context
 from datetime import datetime
+from models import Dataset, Question
+from functions.metrics import observe_phase, phase_timer
+from functions.validation import REQUIRED_COLUMNS
 
-def export_csv(data, filter_option):
+# Служебные колонки экспорта, за ними идут колонки исходного файла
+BASE_COLUMNS = ['question_id', 'question_text', 'answer_text', 'score', 'score_text', 'categories']
+
+# Размер куска CSV, отдаваемого клиенту за раз
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+def export_filename(filter_option, extension):
+    """
+    Имя файла экспорта.
+    """
+    return f'medical_evaluation_{filter_option}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+
+def export_columns(query, batch_size=1000):
     """
-    Экспорт данных в CSV формат
+    Стабильный список колонок экспорта: служебные + дополнительные в порядке исходного файла.
+    Порядок берётся из последней загрузки (Dataset); для данных, загруженных раньше,
+    ключи additional_data собираются одним потоковым проходом.
     """
+    with phase_timer('export', 'columns'):
+        dataset = Dataset.query.order_by(Dataset.id.desc()).first()
+        if dataset and dataset.columns is not None:
+            extra = [col for col in dataset.columns if col not in REQUIRED_COLUMNS]
+        else:
+            extra = {}
+            for (additional_data,) in query.with_entities(Question.additional_data).yield_per(batch_size):
+                extra.update(dict.fromkeys(additional_data or {}))
+    return BASE_COLUMNS + [col for col in extra if col not in BASE_COLUMNS]
+
+
+def project_columns(columns, requested):
+    """
+    Проекция колонок экспорта по параметру columns (имена через запятую) в порядке запроса.
+    При неизвестных колонках - ValueError.
+    """
+    names = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ValueError(f"Неизвестные колонки: {', '.join(unknown)}. Доступны: {', '.join(columns)}")
+    return names or columns
+
+
+def iter_export_rows(query, batch_size=1000):
+    """
+    Генератор строк экспорта. Вопросы читаются из БД пачками по batch_size
+    (на PostgreSQL - серверным курсором), категории подгружаются одним запросом на пачку.
+    В метрику фазы fetch идёт только время внутри генератора (SQL, ORM, сборка строк),
+    без времени записи строк потребителем.
+    """
+    elapsed = 0.0
+    resumed = time.perf_counter()
     try:
-        import pandas as pd
-        import io
-        
-        df = pd.DataFrame(data)
-        
-        # Создаем CSV в памяти
-        output = io.StringIO()
-        df.to_csv(output, index=False, encoding='utf-8')
-        output.seek(0)
-        
-        # Создаем response
-        response = send_file(
-            io.BytesIO(output.getvalue().encode('utf-8')),
+        for q in query.yield_per(batch_size):
+            row = {
+                'question_id': q.id,
+                'question_text': q.question_text,
+                'answer_text': q.answer_text,
+                'score': q.score,
+                'score_text': 'Согласен' if q.score == 1 else ('Не согласен' if q.score == 0 else 'Не оценено'),
+                'categories': ' | '.join([c.name for c in q.categories]) if q.categories else '',  # Категории берём именами
+            }
+            # Добавляем дополнительные данные
+            if q.additional_data:
+                row.update(q.additional_data)
+            elapsed += time.perf_counter() - resumed
+            yield row
+            resumed = time.perf_counter()
+    finally:
+        observe_phase('export', 'fetch', elapsed)
+
+
+def iter_csv(rows, columns):
+    """
+    Потоковая генерация CSV: заголовок отдаётся сразу, дальше - кусками по CSV_CHUNK_SIZE.
+    Время внутри генератора (вместе с fetch, без отправки клиенту) идёт в фазу write_csv.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore', lineterminator='\n')
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    elapsed = 0.0
+    resumed = time.perf_counter()
+    try:
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= CSV_CHUNK_SIZE:
+                elapsed += time.perf_counter() - resumed
+                yield buffer.getvalue()
+                resumed = time.perf_counter()
+                buffer.seek(0)
+                buffer.truncate()
+        elapsed += time.perf_counter() - resumed
+        yield buffer.getvalue()
+    finally:
+        observe_phase('export', 'write_csv', elapsed)
+
+
+def export_csv(rows, columns, filter_option):
+    """
+    Экспорт данных в CSV формат потоковым ответом
+    """
+    try:
+        filename = export_filename(filter_option, 'csv')
+        return Response(
+            stream_with_context(iter_csv(rows, columns)),
             mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'medical_evaluation_{filter_option}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
-        
-        return response
-        
+
     except Exception as e:
         return jsonify({'error': f'Ошибка экспорта CSV: {str(e)}'}), 500
 
 
-def export_excel(data, filter_option):
+def write_excel(rows, columns, output):
+    """
+    Потоковая запись Excel (openpyxl write-only): строки сразу уходят на диск,
+    статистика считается в том же проходе. Время записи (вместе с fetch) идёт в фазу write_excel.
+    """
+    # openpyxl импортируем при первом экспорте в Excel, а не при старте воркера
+    from openpyxl import Workbook
+
+    with phase_timer('export', 'write_excel'):
+        workbook = Workbook(write_only=True)
+
+        # Основные данные
+        sheet = workbook.create_sheet('Результаты оценки')
+        sheet.append(columns)
+        total = agree = disagree = unevaluated = 0
+        for row in rows:
+            sheet.append([row.get(col) for col in columns])
+            total += 1
+            if row['score'] == 1:
+                agree += 1
+            elif row['score'] == 0:
+                disagree += 1
+            elif row['score'] is None:
+                unevaluated += 1
+
+        # Статистика на отдельном листе
+        stats = workbook.create_sheet('Статистика')
+        stats.append(['Категория', 'Количество'])
+        stats.append(['Всего вопросов', total])
+        stats.append(['Согласен (score=1)', agree])
+        stats.append(['Не согласен (score=0)', disagree])
+        stats.append(['Не оценено (score=null)', unevaluated])
+        stats.append(['Процент оцененных', f"{((total - unevaluated) / total * 100):.1f}%" if total > 0 else "0%"])
+
+        workbook.save(output)
+
+
+def export_excel(rows, columns, filter_option):
     """
     Экспорт данных в Excel формат
     """
     try:
-        import pandas as pd
-        import io
-        
-        df = pd.DataFrame(data)
-        
-        # Создаем Excel в памяти
-        output = io.BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Основные данные
-            df.to_excel(writer, sheet_name='Результаты оценки', index=False)
-            
-            # Статистика на отдельном листе
-            stats_data = [
-                {'Категория': 'Всего вопросов', 'Количество': len(data)},
-                {'Категория': 'Согласен (score=1)', 'Количество': sum(1 for row in data if row['score'] == 1)},
-                {'Категория': 'Не согласен (score=0)', 'Количество': sum(1 for row in data if row['score'] == 0)},
-                {'Категория': 'Не оценено (score=null)', 'Количество': sum(1 for row in data if row['score'] is None)},
-                {'Категория': 'Процент оцененных', 'Количество': f"{((len(data) - sum(1 for row in data if row['score'] is None)) / len(data) * 100):.1f}%" if len(data) > 0 else "0%"}
-            ]
-            stats_df = pd.DataFrame(stats_data)
-            stats_df.to_excel(writer, sheet_name='Статистика', index=False)
-        
+        # Небольшие файлы остаются в памяти, большие сбрасываются во временный файл на диске
+        output = tempfile.SpooledTemporaryFile(max_size=current_app.config['EXPORT_SPOOL_MAX_SIZE'])
+        write_excel(rows, columns, output)
         output.seek(0)
         
         # Создаем response
@@ -67,7 +177,7 @@ def export_excel(data, filter_option):
             output,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
-            download_name=f'medical_evaluation_{filter_option}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+            download_name=export_filename(filter_option, 'xlsx')
         )
         
         return response
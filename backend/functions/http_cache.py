@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость, без неё отдаём gzip
+    brotli = None
+
+# Кодировки сжатия в порядке предпочтения
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def make_etag(*parts):
+    """
+    ETag по отпечатку данных ответа (параметры запроса, id и версии строк и т.п.).
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU-кэш готовых (сериализованных и сжатых) тел ответов по ключу (ETag, кодировка).
+    ETag зависит от версий данных, поэтому записи не устаревают, а только вытесняются.
+    """
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+
+    def set(self, key, body, max_size):
+        with self._lock:
+            self._items[key] = body
+            self._items.move_to_end(key)
+            while len(self._items) > max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_cache = ResponseCache()
+
+
+def _accepted_encoding(size):
+    """
+    Кодировка сжатия для ответа размером size байт или None.
+    """
+    if size < current_app.config['COMPRESS_MIN_SIZE']:
+        return None
+    for encoding in ENCODINGS:
+        if encoding in request.accept_encodings:
+            return encoding
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def cached_json(etag, build):
+    """
+    JSON-ответ с ETag для GET-эндпоинтов.
+    Если If-None-Match совпадает с etag - 304 без тела, build() не вызывается.
+    Иначе тело берётся из кэша или строится build(), сериализуется и сжимается (br/gzip),
+    если клиент это поддерживает, а ответ не меньше COMPRESS_MIN_SIZE байт.
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        body = _cache.get((etag, None))
+        if body is None:
+            body = current_app.json.dumps(build()).encode('utf-8')
+            _cache.set((etag, None), body, current_app.config['RESPONSE_CACHE_SIZE'])
+
+        encoding = _accepted_encoding(len(body))
+        if encoding:
+            compressed = _cache.get((etag, encoding))
+            if compressed is None:
+                compressed = _compress(body, encoding)
+                _cache.set((etag, encoding), compressed, current_app.config['RESPONSE_CACHE_SIZE'])
+            body = compressed
+
+        response = current_app.response_class(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    # Ответ можно хранить, но перед использованием - сверить ETag с сервером
+    response.cache_control.no_cache = True
+    return response
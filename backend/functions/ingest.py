@@ -0,0 +1,316 @@
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from flask import current_app
+from models import Dataset, Question, db, question_categories
+from functions.bulk_load import get_bulk_loader
+from functions.metrics import observe_phase, phase_timer
+from functions.validation import REQUIRED_COLUMNS, RowValidator
+
+# Режимы загрузки: полная замена набора данных или слияние с существующими вопросами
+UPLOAD_MODES = ('replace', 'merge')
+
+# Колонки, которые приходят из файла (score и прочие служебные поля не трогаем при слиянии)
+CONTENT_COLUMNS = ['id', 'question_text', 'answer_text', 'topic', 'additional_data', 'content_hash']
+
+
+class UploadValidationError(Exception):
+    """
+    Ошибка валидации загружаемого файла. payload отдаётся клиенту как есть.
+    """
+
+    def __init__(self, payload):
+        super().__init__(payload.get('error'))
+        self.payload = payload
+
+
+def _format_value(value):
+    """
+    Приведение значения ячейки к виду, пригодному для JSON.
+    """
+    if isinstance(value, (datetime, date)):
+        # Сохраняем исходный формат даты M/d/yyyy
+        return f'{value.month}/{value.day}/{value.year}'
+    return value
+
+
+def value_type(value):
+    """
+    Тип значения дополнительной колонки для типизированного экспорта.
+    """
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    return 'string'
+
+
+def merge_types(left, right):
+    """
+    Общий тип колонки: целые и дробные - 'float', прочие расхождения - 'string'.
+    """
+    if left is None or left == right:
+        return right
+    if right is None:
+        return left
+    if {left, right} == {'int', 'float'}:
+        return 'float'
+    return 'string'
+
+
+def content_hash(question_text, answer_text, topic, additional_data):
+    """
+    Хэш содержимого вопроса для поиска изменённых строк при слиянии.
+    """
+    payload = json.dumps([question_text, answer_text, topic, additional_data],
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def open_xlsx(stream):
+    """
+    Открывает первый лист .xlsx в режиме read-only.
+    Возвращает (columns, unnamed, rows), где rows - генератор пар (номер строки в Excel, значения).
+    Колонки без заголовка называются 'Unnamed: N', как в pandas, и перечислены в unnamed:
+    read-only режим отдаёт полную ширину листа, включая пустые оформленные ячейки справа,
+    поэтому такие колонки сохраняются, только если в них есть данные (см. load_questions).
+    """
+    # openpyxl импортируем при первой загрузке, а не при старте воркера
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [str(name) if name is not None else f'Unnamed: {index}' for index, name in enumerate(header)]
+        unnamed = {columns[index] for index, name in enumerate(header) if name is None}
+
+        def iter_rows():
+            width = len(columns)
+            # Строка 1 - заголовок, данные начинаются со строки 2
+            for row_number, values in enumerate(rows, start=2):
+                values = tuple(values[:width]) + (None,) * (width - len(values))
+                # Полностью пустые строки пропускаем (read-only режим может отдавать хвост листа)
+                if all(value is None for value in values):
+                    continue
+                yield row_number, values
+
+        yield columns, unnamed, iter_rows()
+    finally:
+        workbook.close()
+
+
+def _staging_table():
+    """
+    Временная теневая таблица с той же структурой, что и question.
+    """
+    return db.Table(
+        'question_staging', db.MetaData(),
+        *[db.Column(col.name, col.type, primary_key=col.primary_key) for col in Question.__table__.columns],
+        prefixes=['TEMPORARY'],
+    )
+
+
+def _next_version():
+    """
+    Версия для строк, добавляемых загрузкой: больше любой когда-либо выданной.
+    Учитываются и текущие вопросы, и отметка прошлых загрузок (Dataset.max_version),
+    поэтому версии строк, удалённых раньше, не выдаются повторно. Вызывать до удаления строк.
+    Так ETag вида q{id}-v{version} не совпадёт у разных вопросов с одним id.
+    """
+    current = db.session.execute(db.select(db.func.max(Question.version))).scalar()
+    previous = db.session.execute(db.select(db.func.max(Dataset.max_version))).scalar()
+    return max(current or 0, previous or 0) + 1
+
+
+def _replace_dataset(staging, version):
+    """
+    Полная замена вопросов содержимым теневой таблицы. Оценки и категории сбрасываются.
+    Новые строки получают версию version (см. _next_version).
+    """
+    question = Question.__table__
+    names = CONTENT_COLUMNS
+    # Сначала чистим таблицу связей many-to-many, чтобы не нарушить внешние ключи, категории сохраняем
+    db.session.execute(question_categories.delete())
+    removed = db.session.execute(question.delete()).rowcount
+    rows = db.select(*[staging.c[name] for name in names], db.literal(version))
+    added = db.session.execute(question.insert().from_select(names + ['version'], rows)).rowcount
+    return {'added_count': added, 'updated_count': 0, 'unchanged_count': 0, 'removed_count': removed}
+
+
+def _upsert(table):
+    """
+    INSERT ... ON CONFLICT для текущего диалекта БД.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f'Режим merge не поддерживается для СУБД {dialect}')
+    return insert(table)
+
+
+def _merge_dataset(staging, version, delete_missing=False):
+    """
+    Слияние теневой таблицы с вопросами по question_id и хэшу содержимого.
+    Записываются только новые и изменённые строки, оценки и категории сохраняются.
+    Новые строки получают версию version (см. _next_version), изменённые - следующую за своей.
+    """
+    question = Question.__table__
+    joined = staging.outerjoin(question, question.c.id == staging.c.id)
+
+    total, matched, unchanged = db.session.execute(
+        db.select(
+            db.func.count(),
+            db.func.count(question.c.id),
+            db.func.coalesce(db.func.sum(db.case((question.c.content_hash == staging.c.content_hash, 1), else_=0)), 0),
+        ).select_from(joined)
+    ).one()
+
+    removed = 0
+    if delete_missing:
+        db.session.execute(question_categories.delete().where(
+            ~db.exists().where(staging.c.id == question_categories.c.question_id)))
+        removed = db.session.execute(question.delete().where(
+            ~db.exists().where(staging.c.id == question.c.id))).rowcount
+
+    changed = db.select(*[staging.c[name] for name in CONTENT_COLUMNS], db.literal(version)).select_from(joined).where(
+        db.or_(question.c.id.is_(None), question.c.content_hash.is_distinct_from(staging.c.content_hash)))
+    upsert = _upsert(question).from_select(CONTENT_COLUMNS + ['version'], changed)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[question.c.id],
+        set_={**{name: upsert.excluded[name] for name in CONTENT_COLUMNS if name != 'id'},
+              'version': question.c.version + 1},
+    )
+    db.session.execute(upsert)
+
+    return {
+        'added_count': total - matched,
+        'updated_count': matched - unchanged,
+        'unchanged_count': unchanged,
+        'removed_count': removed,
+    }
+
+
+def load_questions(stream, filename=None, chunk_size=5000, mode='replace', delete_missing=False, progress=None):
+    """
+    Потоковая загрузка вопросов из .xlsx.
+    Каждая строка валидируется один раз (RowValidator) и сразу уходит пачками по chunk_size
+    во временную теневую таблицу, поэтому в памяти находится не больше одной пачки.
+    Живая таблица question затрагивается только в конце, одной атомарной операцией:
+    до коммита читатели видят старый набор данных, при ошибке он остаётся нетронутым.
+    mode='replace' - полная замена, mode='merge' - запись только новых и изменённых строк
+    (delete_missing=True дополнительно удаляет вопросы, которых нет в файле).
+    progress(phase, rows) - необязательный колбэк прогресса (для фоновых задач).
+    Работает в текущей транзакции сессии: коммит и откат остаются за вызывающим кодом.
+    При ошибке валидации бросает UploadValidationError.
+    Возвращает сводку загрузки.
+    Длительности фаз (parse, staging, replace/merge, finalize) пишутся в метрики.
+    """
+    started = time.perf_counter()
+    with open_xlsx(stream) as (columns, unnamed, rows):
+        missing_cols = [col for col in REQUIRED_COLUMNS if col not in columns]
+        if missing_cols:
+            raise UploadValidationError({
+                'error': f"В файле отсутствуют необходимые колонки: {', '.join(missing_cols)}"
+            })
+        extra_columns = [col for col in columns if col not in REQUIRED_COLUMNS]
+        has_topic = 'topic' in columns
+
+        # Теневая таблица могла остаться на соединении после неудачной загрузки (SQLite)
+        staging = _staging_table()
+        connection = db.session.connection()
+        staging.drop(connection, checkfirst=True)
+        staging.create(connection)
+
+        loader = get_bulk_loader(staging)
+        validator = RowValidator(columns)
+        column_types = {}
+        chunk = []
+
+        for row_number, values in rows:
+            record = dict(zip(columns, values))
+
+            question_id = validator.check(row_number, record)
+            # После первой ошибки в БД уже ничего не пишем, только собираем остальные ошибки
+            if question_id is None or validator.has_errors:
+                continue
+
+            question_text = str(record['question_text'])
+            answer_text = str(record['answer_text'])
+            topic = record['topic'] if has_topic else ''
+            topic = str(topic) if topic is not None else None
+            # Пустые значения колонок без заголовка не сохраняем: они не должны попадать в хэш
+            additional_data = {col: _format_value(record[col]) for col in extra_columns
+                               if col not in unnamed or record[col] is not None}
+            for col, value in additional_data.items():
+                if value is not None:
+                    column_types[col] = merge_types(column_types.get(col), value_type(value))
+            chunk.append({
+                'id': question_id,
+                'question_text': question_text,
+                'answer_text': answer_text,
+                'topic': topic,
+                'additional_data': additional_data,
+                'content_hash': content_hash(question_text, answer_text, topic, additional_data),
+            })
+            if len(chunk) >= chunk_size:
+                loader.load(chunk)
+                chunk = []
+                if progress:
+                    progress('loading', loader.rows)
+
+        if validator.has_errors:
+            raise UploadValidationError(validator.report())
+
+        loader.load(chunk)
+
+    # Колонки без заголовка, в которых не оказалось данных, в набор не попадают
+    columns = [col for col in columns if col not in unnamed or col in column_types]
+
+    # Чтение и валидация файла - всё, кроме записи пачек в теневую таблицу
+    observe_phase('upload', 'parse', time.perf_counter() - started - loader.elapsed)
+    observe_phase('upload', 'staging', loader.elapsed)
+
+    # --- Подмена или слияние набора данных ---
+    if progress:
+        progress(mode, loader.rows)
+    with phase_timer('upload', mode):
+        version = _next_version()
+        if mode == 'merge':
+            summary = _merge_dataset(staging, version, delete_missing=delete_missing)
+            previous = Dataset.query.order_by(Dataset.id.desc()).first()
+            if previous and previous.columns:
+                # При слиянии сохраняем объединение колонок, в порядке первого появления
+                columns = previous.columns + [col for col in columns if col not in previous.columns]
+                # Оставшиеся строки могут содержать значения других типов: типы объединяем,
+                # а если прежние типы неизвестны (загрузка до их учёта) - не записываем
+                if previous.column_types is None:
+                    column_types = None
+                else:
+                    column_types = {col: merge_types(previous.column_types.get(col), column_types.get(col))
+                                    for col in previous.column_types.keys() | column_types.keys()}
+        else:
+            summary = _replace_dataset(staging, version)
+
+    with phase_timer('upload', 'finalize'):
+        staging.drop(connection)
+        row_count = db.session.query(db.func.count(Question.id)).scalar()
+        db.session.add(Dataset(filename=filename, columns=columns, column_types=column_types,
+                               row_count=row_count, max_version=version))
+
+    summary.update({
+        'mode': mode,
+        'total_questions_processed': loader.rows,
+        'rows_per_second': loader.rows_per_second,
+    })
+    current_app.logger.info('Upload (%s): %s rows via %s, %s rows/s', mode, loader.rows, loader.name, loader.rows_per_second)
+    return summary
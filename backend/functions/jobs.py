@@ -0,0 +1,264 @@
+import glob
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+from models import Job, Question, db
+from functions.columnar import COLUMNAR_FORMATS, write_columnar
+from functions.events import notify
+from functions.export import export_columns, export_filename, iter_csv, iter_export_rows, project_columns, write_excel
+from functions.ingest import UploadValidationError, load_questions
+from functions.queries import apply_question_filters
+from functions.stats import invalidate_stats
+
+# Расширения файлов для форматов экспорта
+EXPORT_EXTENSIONS = {'csv': 'csv', 'excel': 'xlsx',
+                     **{name: extension for name, (extension, _) in COLUMNAR_FORMATS.items()}}
+
+# Как часто (сек) сохранять прогресс задачи в БД
+PROGRESS_INTERVAL = 1.0
+
+# Сообщение для задач, воркер которых перестал отмечаться
+STALE_JOB_ERROR = 'Задача прервана: воркер, выполнявший её, был остановлен.'
+
+_executor = None
+_executor_lock = threading.Lock()
+# Задачи этого процесса (в очереди пула и выполняющиеся), их отмечает поток heartbeat
+_active_jobs = set()
+
+
+def _get_executor(app):
+    """
+    Пул потоков для фоновых задач, один на процесс воркера.
+    Вместе с пулом запускается поток, отмечающий задачи процесса живыми.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config['JOBS_MAX_WORKERS'], thread_name_prefix='job')
+            threading.Thread(target=_heartbeat_loop, args=(app,), name='job-heartbeat', daemon=True).start()
+    return _executor
+
+
+def _heartbeat_loop(app):
+    """
+    Раз в JOBS_HEARTBEAT_INTERVAL секунд обновляет heartbeat_at задач процесса.
+    Задачи без свежей отметки (процесс убит или перезапущен) завершает fail_stale_jobs().
+    """
+    while True:
+        time.sleep(app.config['JOBS_HEARTBEAT_INTERVAL'])
+        with _executor_lock:
+            job_ids = list(_active_jobs)
+        if not job_ids:
+            continue
+        try:
+            with app.app_context(), db.engine.begin() as connection:
+                connection.execute(Job.__table__.update().where(Job.__table__.c.id.in_(job_ids))
+                                   .values(heartbeat_at=datetime.utcnow()))
+        except Exception as e:
+            app.logger.warning('Не удалось отметить фоновые задачи: %s', e)
+
+
+def jobs_dir():
+    """
+    Каталог для загруженных файлов и готовых результатов задач.
+    Имена файлов задачи начинаются с её id (см. _remove_job_files).
+    """
+    path = current_app.config['JOBS_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def _remove_job_files(job):
+    """
+    Удаляет файлы задачи: результат и всё, что лежит в каталоге задач под её id
+    (загруженный файл, недописанный экспорт).
+    """
+    paths = set(glob.glob(os.path.join(glob.escape(jobs_dir()), f'{job.id}.*')))
+    if job.artifact_path:
+        paths.add(job.artifact_path)
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _update_job(job_id, **fields):
+    """
+    Обновление задачи отдельным соединением: изменения видны сразу,
+    а не после коммита транзакции, в которой идёт сама работа.
+    """
+    with db.engine.begin() as connection:
+        connection.execute(Job.__table__.update().where(Job.__table__.c.id == job_id).values(**fields))
+
+
+class JobProgress:
+    """
+    Колбэк прогресса задачи: progress(phase, rows).
+    Пишет в БД при смене фазы и не чаще раза в PROGRESS_INTERVAL секунд.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.phase = None
+        self.rows = 0
+        self._written_at = 0.0
+
+    def __call__(self, phase, rows=None):
+        if rows is not None:
+            self.rows = rows
+        now = time.monotonic()
+        if phase != self.phase or now - self._written_at >= PROGRESS_INTERVAL:
+            self.phase = phase
+            self._written_at = now
+            try:
+                _update_job(self.job_id, phase=phase, rows_processed=self.rows)
+            except Exception as e:
+                # Прогресс - best effort, из-за него задача падать не должна
+                current_app.logger.warning('Job %s: не удалось сохранить прогресс: %s', self.job_id, e)
+
+
+def fail_stale_jobs(job_id=None):
+    """
+    Помечает failed задачи в статусе queued/running без отметки heartbeat дольше JOBS_STALE_AFTER секунд:
+    их воркер остановлен, и сами они уже не завершатся. Файлы таких задач удаляются.
+    job_id - проверить только одну задачу. Коммит остаётся за вызывающим кодом.
+    """
+    border = datetime.utcnow() - timedelta(seconds=current_app.config['JOBS_STALE_AFTER'])
+    query = Job.query.filter(Job.status.in_(('queued', 'running')),
+                             db.func.coalesce(Job.heartbeat_at, Job.created_at) < border)
+    if job_id is not None:
+        query = query.filter(Job.id == job_id)
+    for job in query.all():
+        _remove_job_files(job)
+        job.status = 'failed'
+        job.error = STALE_JOB_ERROR
+        job.artifact_path = None
+        job.finished_at = datetime.utcnow()
+
+
+def _cleanup_jobs():
+    """
+    Завершает прерванные задачи и удаляет задачи (и их файлы),
+    завершившиеся больше JOBS_RETENTION_HOURS часов назад.
+    """
+    fail_stale_jobs()
+    border = datetime.utcnow() - timedelta(hours=current_app.config['JOBS_RETENTION_HOURS'])
+    for job in Job.query.filter(Job.finished_at < border).all():
+        _remove_job_files(job)
+        db.session.delete(job)
+
+
+def submit_job(kind, runner, params, job_id=None, **kwargs):
+    """
+    Регистрирует задачу в БД и запускает её в пуле потоков.
+    runner(job_id, progress, **kwargs) возвращает словарь полей Job для записи по завершении.
+    job_id - заранее выданный new_job_id(), если файлы задачи сохраняются до её регистрации.
+    """
+    _cleanup_jobs()
+    job = Job(id=job_id or new_job_id(), kind=kind, status='queued', params=params, heartbeat_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+    with _executor_lock:
+        _active_jobs.add(job.id)
+    executor.submit(_run_job, app, job.id, runner, kwargs)
+    return job
+
+
+def _run_job(app, job_id, runner, kwargs):
+    try:
+        _execute_job(app, job_id, runner, kwargs)
+    finally:
+        with _executor_lock:
+            _active_jobs.discard(job_id)
+
+
+def _execute_job(app, job_id, runner, kwargs):
+    with app.app_context():
+        _update_job(job_id, status='running', started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+        try:
+            fields = runner(job_id, JobProgress(job_id), **kwargs) or {}
+        except UploadValidationError as e:
+            db.session.rollback()
+            _update_job(job_id, status='failed', error=str(e), result=e.payload, finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Job %s failed', job_id)
+            _update_job(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+        else:
+            # Закрываем транзакцию задачи (например, читающую после экспорта) до записи статуса
+            db.session.close()
+            _update_job(job_id, status='done', phase='done', finished_at=datetime.utcnow(), **fields)
+
+
+def run_upload_job(job_id, progress, path, filename, mode, delete_missing):
+    """
+    Фоновая загрузка .xlsx, заранее сохранённого в path.
+    """
+    try:
+        with open(path, 'rb') as stream:
+            summary = load_questions(stream, filename=filename,
+                                     chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'],
+                                     mode=mode, delete_missing=delete_missing, progress=progress)
+        notify('dataset_changed', mode=mode, summary=summary)
+        db.session.commit()
+        invalidate_stats()
+    finally:
+        os.remove(path)
+    return {'result': summary, 'rows_processed': summary['total_questions_processed']}
+
+
+def _track_rows(rows, progress, every):
+    """
+    Пропускает строки экспорта насквозь, отмечая прогресс каждые every строк.
+    """
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % every == 0:
+            progress('exporting', count)
+    progress('writing', count)
+
+
+def run_export_job(job_id, progress, format_type, filters):
+    """
+    Фоновый экспорт в файл в каталоге задач. filters - параметры как у GET /api/export.
+    """
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    filter_option = filters.get('filter', 'all')
+    query = apply_question_filters(Question.query, MultiDict(filters)).order_by(Question.id)
+    columns = export_columns(query, batch_size=batch_size)
+    if filters.get('columns'):
+        columns = project_columns(columns, filters['columns'])
+
+    extension = EXPORT_EXTENSIONS[format_type]
+    path = os.path.join(jobs_dir(), f'{job_id}.{extension}')
+    # Генератор ленивый: для колоночных форматов он не запускается
+    rows = _track_rows(iter_export_rows(query, batch_size=batch_size), progress, batch_size)
+    if format_type in COLUMNAR_FORMATS:
+        with open(path, 'wb') as output:
+            write_columnar(format_type, query, columns, output, batch_size=batch_size, progress=progress)
+    elif format_type == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            for chunk in iter_csv(rows, columns):
+                output.write(chunk)
+    else:
+        with open(path, 'wb') as output:
+            write_excel(rows, columns, output)
+
+    return {
+        'artifact_path': path,
+        'artifact_name': export_filename(filter_option, extension),
+        'rows_processed': progress.rows,
+    }
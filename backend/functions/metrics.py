@@ -0,0 +1,227 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Границы корзин гистограмм длительности (сек)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Границы корзин гистограммы числа SQL-запросов на HTTP-запрос
+SQL_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+# Метка endpoint для SQL вне HTTP-запросов (фоновые задачи, CLI)
+BACKGROUND = 'background'
+
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """
+    Счётчик с метками (формат Prometheus counter).
+    """
+    type = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield f'{self.name}{_format_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    """
+    Гистограмма с метками (формат Prometheus histogram).
+    """
+    type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # метки -> [счётчики корзин..., сумма, количество]
+
+    def observe(self, labels, value):
+        with _lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self):
+        for labels, data in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, data):
+                le = 'le="%s"' % bound
+                yield f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {count}'
+            le = 'le="+Inf"'
+            yield f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {data[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {round(data[-2], 6)}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {data[-1]}'
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Длительность HTTP-запросов, включая отдачу потокового тела',
+                             ('endpoint', 'method'))
+REQUESTS = Counter('http_requests_total', 'Количество HTTP-запросов', ('endpoint', 'method', 'status'))
+REQUEST_SQL = Histogram('http_request_sql_statements', 'Число SQL-запросов на один HTTP-запрос',
+                        ('endpoint', 'method'), buckets=SQL_COUNT_BUCKETS)
+SQL_STATEMENTS = Counter('db_statements_total', 'Количество SQL-запросов', ('endpoint',))
+SQL_DURATION = Counter('db_statement_seconds_total', 'Суммарное время выполнения SQL-запросов', ('endpoint',))
+PHASE_DURATION = Histogram('phase_duration_seconds', 'Длительность фаз загрузки и экспорта', ('operation', 'phase'))
+
+METRICS = (REQUEST_DURATION, REQUESTS, REQUEST_SQL, SQL_STATEMENTS, SQL_DURATION, PHASE_DURATION)
+
+
+def render_metrics():
+    """
+    Все метрики процесса в текстовом формате Prometheus.
+    """
+    lines = []
+    with _lock:
+        for metric in METRICS:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def observe_phase(operation, phase, seconds):
+    PHASE_DURATION.observe((operation, phase), seconds)
+
+
+@contextmanager
+def phase_timer(operation, phase):
+    """
+    Замер фазы операции (например, ('upload', 'swap')) в гистограмму phase_duration_seconds.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(operation, phase, time.perf_counter() - started)
+
+
+class RequestMetrics:
+    """
+    Метрики одного HTTP-запроса. Живёт в g и в замыкании, которое срабатывает после отдачи тела.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.profiler = None
+
+
+def _current_request_metrics():
+    return g.get('request_metrics') if has_app_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    metrics = _current_request_metrics()
+    if metrics is not None:
+        metrics.sql_count += 1
+        metrics.sql_time += elapsed
+    endpoint = metrics.endpoint if metrics is not None else BACKGROUND
+    SQL_STATEMENTS.inc((endpoint,))
+    SQL_DURATION.inc((endpoint,), elapsed)
+
+
+def _start_profiler():
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except (ValueError, RuntimeError):
+        # Профилировщик уже работает в этом потоке (или, в Python 3.12+, в любом другом)
+        return None
+    return profiler
+
+
+def _dump_profile(app, metrics, method, duration):
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    name = metrics.endpoint.strip('/').replace('/', '_').replace('<', '').replace('>', '').replace(':', '-') or 'root'
+    path = os.path.join(directory, f'{datetime.now():%Y%m%d_%H%M%S_%f}_{method}_{name}_{round(duration * 1000)}ms.prof')
+    metrics.profiler.dump_stats(path)
+    app.logger.warning('Медленный запрос %s %s: %.0f мс, профиль: %s', method, metrics.endpoint, duration * 1000, path)
+
+
+def init_metrics(app):
+    """
+    Подключает сбор метрик к приложению и регистрирует эндпоинт /metrics.
+    Длительность запроса считается до конца отдачи тела (для потокового экспорта тоже).
+    Если задан PROFILE_SLOW_REQUESTS_MS, запросы профилируются cProfile,
+    и профили запросов дольше порога сохраняются в PROFILE_DIR (смотреть: python -m pstats файл).
+    Метрики хранятся в памяти процесса: каждый воркер gunicorn отдаёт свои.
+    """
+    slow_ms = app.config.get('PROFILE_SLOW_REQUESTS_MS')
+
+    @app.before_request
+    def start_request_metrics():
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.request_metrics = RequestMetrics(endpoint)
+        if slow_ms:
+            g.request_metrics.profiler = _start_profiler()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        metrics = g.get('request_metrics')
+        if metrics is None:
+            return response
+        method = request.method
+        status = str(response.status_code)
+
+        def record():
+            duration = time.perf_counter() - metrics.started
+            REQUEST_DURATION.observe((metrics.endpoint, method), duration)
+            REQUESTS.inc((metrics.endpoint, method, status))
+            REQUEST_SQL.observe((metrics.endpoint, method), metrics.sql_count)
+            if metrics.profiler is not None:
+                metrics.profiler.disable()
+                if duration * 1000 >= slow_ms:
+                    _dump_profile(app, metrics, method, duration)
+
+        response.call_on_close(record)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,84 @@
+import json
+from sqlalchemy.dialects.postgresql import JSONB
+from models import FTS_CONFIG, FTS_DOCUMENT, Question, db, question_categories
+
+# Префикс параметров фильтрации по additional_data: ?data.<ключ>=<значение>
+DATA_FILTER_PREFIX = 'data.'
+
+
+def apply_score_filter(query, filter_option):
+    """
+    Фильтрация по наличию оценки: 'all', 'evaluated', 'unevaluated'.
+    """
+    if filter_option == 'evaluated':
+        query = query.filter(Question.score.isnot(None))
+    elif filter_option == 'unevaluated':
+        query = query.filter(Question.score.is_(None))
+    return query
+
+
+def _data_candidates(value):
+    """
+    Значение из query string и, если оно разбирается как JSON-скаляр, его типизированный вариант
+    (в additional_data числа хранятся числами: ?data.year=2024 должно найти {"year": 2024}).
+    """
+    candidates = [value]
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return candidates
+    if isinstance(parsed, (int, float, bool)) and parsed not in candidates:
+        candidates.append(parsed)
+    return candidates
+
+
+def apply_question_filters(query, args):
+    """
+    Фильтры списка вопросов и экспорта по параметрам запроса (args - MultiDict):
+        filter (str): 'all', 'evaluated', 'unevaluated'
+        q (str): полнотекстовый поиск по question_text и answer_text
+        topic (str): точное совпадение темы
+        category_id (int): вопросы с указанной категорией
+        data.<ключ> (str): совпадение значения в additional_data
+    На PostgreSQL поиск и фильтр по additional_data используют GIN-индексы.
+    """
+    query = apply_score_filter(query, args.get('filter', 'all'))
+    dialect = db.session.get_bind().dialect.name
+
+    search = (args.get('q') or '').strip()
+    if search:
+        if dialect == 'postgresql':
+            query = query.filter(db.text(f"{FTS_DOCUMENT} @@ websearch_to_tsquery('{FTS_CONFIG}', :fts_query)")
+                                 .bindparams(fts_query=search))
+        else:
+            # Без PostgreSQL (SQLite для разработки) - поиск подстроки через LIKE
+            query = query.filter(db.or_(
+                Question.question_text.contains(search, autoescape=True),
+                Question.answer_text.contains(search, autoescape=True),
+            ))
+
+    topic = args.get('topic')
+    if topic:
+        query = query.filter(Question.topic == topic)
+
+    category_id = args.get('category_id', type=int)
+    if category_id is not None:
+        query = query.filter(db.exists().where(
+            question_categories.c.question_id == Question.id,
+            question_categories.c.category_id == category_id,
+        ))
+
+    for name, value in args.items():
+        if not name.startswith(DATA_FILTER_PREFIX):
+            continue
+        key = name[len(DATA_FILTER_PREFIX):]
+        candidates = _data_candidates(value)
+        if dialect == 'postgresql':
+            # JSONB @> - использует GIN-индекс ix_question_additional_data
+            additional_data = db.type_coerce(Question.additional_data, JSONB)
+            query = query.filter(db.or_(*[additional_data.contains({key: c}) for c in candidates]))
+        else:
+            # SQLite: json_extract возвращает значение с исходным типом
+            query = query.filter(db.func.json_extract(Question.additional_data, f'$."{key}"').in_(candidates))
+
+    return query
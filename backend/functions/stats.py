@@ -0,0 +1,73 @@
+import threading
+import time
+from models import Category, Question, db, question_categories
+
+# Кэш статистики в памяти процесса: значение и момент, до которого оно актуально
+_cache = {'value': None, 'expires_at': 0.0}
+_lock = threading.Lock()
+
+
+def compute_stats():
+    """
+    Статистика по вопросам: итоги одним запросом с условной агрегацией,
+    плюс разбивка по категориям и по темам (по одному GROUP BY).
+    """
+    total, evaluated, agree, disagree = db.session.execute(
+        db.select(
+            db.func.count(Question.id),
+            db.func.count(Question.score),
+            db.func.coalesce(db.func.sum(db.case((Question.score == 1, 1), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((Question.score == 0, 1), else_=0)), 0),
+        )
+    ).one()
+
+    by_category = db.session.execute(
+        db.select(Category.id, Category.name, db.func.count(Question.id), db.func.count(Question.score))
+        .select_from(Category)
+        .outerjoin(question_categories, question_categories.c.category_id == Category.id)
+        .outerjoin(Question, Question.id == question_categories.c.question_id)
+        .group_by(Category.id, Category.name)
+        .order_by(Category.id)
+    ).all()
+
+    by_topic = db.session.execute(
+        db.select(Question.topic, db.func.count(Question.id), db.func.count(Question.score))
+        .group_by(Question.topic)
+        .order_by(Question.topic)
+    ).all()
+
+    return {
+        'total': total,
+        'evaluated': evaluated,
+        'unevaluated': total - evaluated,
+        'agree': agree,
+        'disagree': disagree,
+        'by_category': [
+            {'id': id_, 'name': name, 'total': count, 'evaluated': evaluated_count}
+            for id_, name, count, evaluated_count in by_category
+        ],
+        'by_topic': [
+            {'topic': topic, 'total': count, 'evaluated': evaluated_count}
+            for topic, count, evaluated_count in by_topic
+        ],
+    }
+
+
+def get_stats(ttl):
+    """
+    Статистика из кэша процесса; пересчитывается не чаще раза в ttl секунд.
+    Параллельные запросы ждут один пересчёт, а не запускают свои.
+    """
+    with _lock:
+        if _cache['value'] is None or time.monotonic() >= _cache['expires_at']:
+            _cache['value'] = compute_stats()
+            _cache['expires_at'] = time.monotonic() + ttl
+        return _cache['value']
+
+
+def invalidate_stats():
+    """
+    Сброс кэша статистики после изменения данных.
+    """
+    with _lock:
+        _cache['value'] = None
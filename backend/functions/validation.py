@@ -0,0 +1,152 @@
+import re
+from datetime import date, datetime
+from models import Question
+
+# Обязательные колонки загружаемого файла
+REQUIRED_COLUMNS = ['question_id', 'question_text', 'answer_text']
+
+# Кандидаты в колонки с датами определяем по названию: слово date / дата целиком
+# (created_date, Дата приёма), но не updated_by или candidate_answer
+DATE_COLUMN_PATTERN = re.compile(r'(^|[_\s])(date|дата)([_\s]|$)', re.IGNORECASE)
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S']
+
+# Лимит длины topic берём из модели, чтобы не разойтись с колонкой в БД
+TOPIC_MAX_LENGTH = Question.__table__.c.topic.type.length
+
+# Сколько нераспознанных значений колонки-кандидата запоминать до первой ячейки-даты;
+# если дат так и не встретилось, колонка датой не считается
+DATE_PENDING_LIMIT = 1000
+
+# Сколько номеров строк показывать в текстовом сообщении (полный список - в errors)
+MESSAGE_ROWS_LIMIT = 20
+
+
+def _parse_int(value):
+    """
+    Возвращает целое значение question_id или None, если значение не целое.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str) and re.fullmatch(r'\s*-?\d+\s*', value):
+        return int(value)
+    return None
+
+
+def _is_date(value):
+    if isinstance(value, (datetime, date)):
+        return True
+    if isinstance(value, str):
+        for fmt in DATE_FORMATS:
+            try:
+                datetime.strptime(value.strip(), fmt)
+                return True
+            except ValueError:
+                continue
+    return False
+
+
+class RowValidator:
+    """
+    Однопроходная валидация строк файла.
+    Собирает все ошибки (с номерами строк Excel) в один структурированный отчёт.
+    """
+
+    def __init__(self, columns):
+        self.has_topic = 'topic' in columns
+        # Колонка проверяется как дата, только если в ней есть настоящие ячейки-даты Excel.
+        # До первой такой ячейки ошибки копятся в date_pending и отбрасываются, если дат в колонке нет.
+        self.date_candidates = [col for col in columns
+                                if col not in REQUIRED_COLUMNS and DATE_COLUMN_PATTERN.search(col)]
+        self.date_columns = set()
+        self.date_pending = {col: [] for col in self.date_candidates}
+        self.errors = []
+        self.first_rows = {}   # question_id -> номер первой строки с этим id
+        self.duplicates = {}   # question_id -> номера всех строк с этим id
+        self.empty_rows = []
+
+    @property
+    def has_errors(self):
+        return bool(self.errors)
+
+    def _add(self, row, column, code, message):
+        self.errors.append({'row': row, 'column': column, 'code': code, 'message': message})
+
+    def check(self, row_number, record):
+        """
+        Проверяет строку. Возвращает question_id (int), если строка корректна, иначе None.
+        """
+        errors_before = len(self.errors)
+
+        empty = [col for col in REQUIRED_COLUMNS if record[col] is None]
+        if empty:
+            self.empty_rows.append(row_number)
+            for col in empty:
+                self._add(row_number, col, 'missing_value', f'Пустое значение в обязательном поле {col}')
+
+        question_id = None
+        if record['question_id'] is not None:
+            question_id = _parse_int(record['question_id'])
+            if question_id is None:
+                self._add(row_number, 'question_id', 'invalid_id',
+                          f"question_id должен быть целым числом (получено {record['question_id']!r})")
+            elif question_id in self.first_rows:
+                self.duplicates.setdefault(question_id, [self.first_rows[question_id]]).append(row_number)
+                self._add(row_number, 'question_id', 'duplicate_id',
+                          f'Дубликат question_id {question_id} (впервые в строке {self.first_rows[question_id]})')
+            else:
+                self.first_rows[question_id] = row_number
+
+        if self.has_topic and record['topic'] is not None and len(str(record['topic'])) > TOPIC_MAX_LENGTH:
+            self._add(row_number, 'topic', 'too_long', f'Длина topic превышает {TOPIC_MAX_LENGTH} символов')
+
+        for col in self.date_candidates:
+            self._check_date(row_number, col, record[col])
+
+        return question_id if len(self.errors) == errors_before else None
+
+    def _check_date(self, row_number, col, value):
+        if value is None:
+            return
+        if isinstance(value, (datetime, date)):
+            if col not in self.date_columns:
+                self.date_columns.add(col)
+                for row, pending in self.date_pending.pop(col, ()):
+                    self._add(row, col, 'invalid_date', f'Не удалось распознать дату {pending!r}')
+            return
+        if _is_date(value):
+            return
+        if col in self.date_columns:
+            self._add(row_number, col, 'invalid_date', f'Не удалось распознать дату {value!r}')
+            return
+        pending = self.date_pending.get(col)
+        if pending is None:
+            return
+        pending.append((row_number, value))
+        if len(pending) > DATE_PENDING_LIMIT:
+            # Слишком много значений не-дат без единой даты - обычная текстовая колонка
+            del self.date_pending[col]
+
+    def report(self):
+        """
+        Итоговый отчёт об ошибках для ответа клиенту.
+        Ключи duplicate_* и empty_rows сохранены для совместимости с фронтендом.
+        """
+        errors = sorted(self.errors, key=lambda error: error['row'])
+        rows = sorted({error['row'] for error in errors})
+        shown = ', '.join(map(str, rows[:MESSAGE_ROWS_LIMIT])) + (', ...' if len(rows) > MESSAGE_ROWS_LIMIT else '')
+        payload = {
+            'error': 'Обнаружены ошибки в файле',
+            'error_count': len(errors),
+            'errors': errors,
+            'message': f'Найдено ошибок: {len(errors)}, в строках: {shown}',
+        }
+        if self.duplicates:
+            payload['duplicate_question_ids'] = sorted(self.duplicates, key=self.first_rows.get)
+            payload['duplicate_rows'] = sorted(row for rows_ in self.duplicates.values() for row in rows_)
+        if self.empty_rows:
+            payload['empty_rows'] = self.empty_rows
+        return payload
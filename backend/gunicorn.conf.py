@@ -0,0 +1,39 @@
+"""
+Конфигурация gunicorn (gunicorn -c gunicorn.conf.py run:app), параметры - из переменных окружения.
+
+GUNICORN_WORKER_CLASS:
+    gthread (по умолчанию) - потоки в каждом воркере; на поток нужно соединение из пула,
+        поэтому GUNICORN_THREADS стоит держать не больше DB_POOL_SIZE + DB_MAX_OVERFLOW.
+    gevent - кооперативная многозадачность для множества медленных клиентов (SSE, большие файлы).
+        Требует пакетов gevent и psycogreen (pip install gevent psycogreen): без psycogreen
+        запросы psycopg2 блокируют весь воркер. Число одновременных запросов к БД
+        всё равно ограничено пулом, ожидание - DB_POOL_TIMEOUT.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# Загрузка и экспорт больших файлов идут дольше стандартных 30 секунд
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Перезапуск воркера после N запросов (0 - не перезапускать), со случайным разбросом
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def post_worker_init(worker):
+    """
+    Для gevent: psycopg2 должен отдавать управление другим гринлетам, пока ждёт ответа БД.
+    """
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            worker.log.warning('psycogreen не установлен: запросы к БД будут блокировать воркер gevent')
+        else:
+            patch_psycopg()
@@ -1,16 +1,52 @@
 
+from flask import current_app, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import orm
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.schema import CreateColumn
 from datetime import datetime
 
+# Ключ bind'а реплики для чтения (SQLALCHEMY_BINDS, задаётся через DATABASE_REPLICA_URL)
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая отправляет чтение эндпоинтов из DB_REPLICA_ENDPOINTS (только GET/HEAD)
+    на реплику. Запись, flush и все остальные запросы идут в основную БД.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        engines = self._db.engines
+        if (bind is None and REPLICA_BIND in engines and engine is engines.get(None)
+                and not self._flushing and _reads_from_replica()):
+            return engines[REPLICA_BIND]
+        return engine
+
+
+def _reads_from_replica():
+    return (has_request_context() and request.method in ('GET', 'HEAD')
+            and request.endpoint in current_app.config.get('DB_REPLICA_ENDPOINTS', ()))
+
+
 # Инициализируем db объект
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Ассоциативная таблица для связи многие-ко-многим
 question_categories = db.Table('question_categories',
     db.Column('question_id', db.Integer, db.ForeignKey('question.id'), primary_key=True),
-    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True),
+    # Первичный ключ начинается с question_id, для фильтра по категории нужен отдельный индекс
+    db.Index('ix_question_categories_category_id', 'category_id')
 )
 
+# Полнотекстовый поиск (PostgreSQL): конфигурация и выражение документа.
+# Выражение должно совпадать с GIN-индексом ix_question_fts из upgrade_schema().
+FTS_CONFIG = 'russian'
+FTS_DOCUMENT = f"to_tsvector('{FTS_CONFIG}', question_text || ' ' || answer_text)"
+
 class Category(db.Model):
     """
     Модель для хранения категорий/тем вопросов.
@@ -23,21 +59,55 @@ class Category(db.Model):
     def __repr__(self):
         return f'<Category {self.name}>'
 
+class Dataset(db.Model):
+    """
+    Модель для хранения версий загруженного набора данных.
+    Каждая успешная загрузка добавляет запись, актуальная версия - последняя.
+    """
+    __tablename__ = 'dataset'
+
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255))
+    columns = db.Column(db.JSON)  # Порядок колонок исходного файла
+    # Типы значений дополнительных колонок ('int', 'float', 'bool', 'string'), см. ingest.value_type
+    column_types = db.Column(db.JSON)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    # Максимальная версия вопросов на момент загрузки: версии удалённых строк не должны выдаваться повторно
+    max_version = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Dataset {self.id}>'
+
 class Question(db.Model):
     """
     Модель для хранения вопросов и ответов.
     """
     __tablename__ = 'question'
+    __table_args__ = (
+        db.Index('ix_question_topic', 'topic'),
+        db.Index('ix_question_score', 'score'),
+        # Частичный индекс для фильтра 'unevaluated' с сортировкой по id
+        db.Index('ix_question_unevaluated', 'id',
+                 postgresql_where=db.text('score IS NULL'), sqlite_where=db.text('score IS NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     question_text = db.Column(db.Text, nullable=False)
     answer_text = db.Column(db.Text, nullable=False)
     topic = db.Column(db.String(200))
     score = db.Column(db.Integer, default=None)  # Добавляем недостающее поле score
-    additional_data = db.Column(db.JSON)  # Для необязательных полей из CSV
+    additional_data = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))  # Для необязательных полей из CSV
+    content_hash = db.Column(db.String(40))  # Хэш содержимого строки файла, для слияния при загрузке
+    # Версия для оптимистической блокировки: увеличивается при каждом изменении оценки или категорий
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Начала текстов для списка вопросов без полных текстов (заполняются через with_expression)
+    question_preview = orm.query_expression()
+    answer_preview = orm.query_expression()
     
-    # Связь многие-ко-многим с категориями
-    categories = db.relationship('Category', secondary=question_categories, lazy='subquery',
+    # Связь многие-ко-многим с категориями.
+    # selectin: категории для всей выборки подгружаются одним запросом WHERE question_id IN (...)
+    categories = db.relationship('Category', secondary=question_categories, lazy='selectin',
                                  backref=db.backref('questions', lazy=True))
 
     def __repr__(self):
@@ -55,3 +125,76 @@ class Question(db.Model):
             'categories': [category.name for category in self.categories]
         }
 
+
+class Job(db.Model):
+    """
+    Модель фоновой задачи (загрузка или экспорт).
+    Таблица - общий реестр задач, поэтому статус виден из любого воркера gunicorn.
+    """
+    __tablename__ = 'job'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(20), nullable=False)  # 'upload' / 'export'
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done / failed
+    phase = db.Column(db.String(50))
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    params = db.Column(db.JSON)
+    result = db.Column(db.JSON)  # Сводка загрузки или отчёт об ошибках валидации
+    error = db.Column(db.Text)
+    artifact_path = db.Column(db.String(500))  # Готовый файл экспорта
+    artifact_name = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Последняя отметка воркера, выполняющего задачу (см. JOBS_HEARTBEAT_INTERVAL)
+    heartbeat_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+    def to_dict(self):
+        """Конвертация объекта в словарь для JSON ответов"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'phase': self.phase,
+            'rows_processed': self.rows_processed,
+            'params': self.params,
+            'result': self.result,
+            'error': self.error,
+            'has_artifact': self.artifact_path is not None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def upgrade_schema():
+    """
+    Досоздание колонок и индексов, добавленных в модели после создания таблиц.
+    db.create_all() уже существующие таблицы не меняет.
+    На PostgreSQL дополнительно: additional_data -> JSONB и GIN-индексы для поиска.
+    """
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+        if connection.dialect.name == 'postgresql':
+            additional_data = next(col for col in inspector.get_columns('question') if col['name'] == 'additional_data')
+            if not isinstance(additional_data['type'], JSONB):
+                connection.execute(db.text(
+                    'ALTER TABLE question ALTER COLUMN additional_data TYPE jsonb USING additional_data::jsonb'))
+            connection.execute(db.text(
+                'CREATE INDEX IF NOT EXISTS ix_question_additional_data ON question USING gin (additional_data jsonb_path_ops)'))
+            connection.execute(db.text(
+                f'CREATE INDEX IF NOT EXISTS ix_question_fts ON question USING gin ({FTS_DOCUMENT})'))
@@ -1,141 +1,166 @@
-from flask import Blueprint, request, jsonify
-import pandas as pd
-from models import Question, Category, db, question_categories
+import os
+import re
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from models import Question, Category, Job, db, question_categories
 from sqlalchemy.exc import IntegrityError
-import pandas as pd
 from flask import send_file
 from datetime import datetime
 import io
-from functions.export import export_csv, export_excel
+from functions.batch import MAX_BATCH_SIZE, apply_batch_update
+from functions.columnar import COLUMNAR_FORMATS, columnar_available, export_columnar
+from functions.events import broker, ensure_listener, iter_events, notify
+from functions.export import export_columns, iter_export_rows, export_csv, export_excel, project_columns
+from functions.http_cache import cached_json, make_etag
+from functions.ingest import load_questions, UploadValidationError, UPLOAD_MODES
+from functions.jobs import (EXPORT_EXTENSIONS, fail_stale_jobs, jobs_dir, new_job_id, run_export_job,
+                           run_upload_job, submit_job)
+from functions.queries import apply_question_filters
+from functions.stats import get_stats, invalidate_stats
 
 
 api = Blueprint('api', __name__)
 
-@api.route('/api/upload', methods=['POST'])
-def upload_file():
+def _parse_upload_request():
     """
-    Эндпоинт для загрузки и обработки .xlsx файла.
+    Проверка запроса на загрузку файла.
+    Возвращает ((file, mode, delete_missing), None) или (None, ответ с ошибкой).
     """
     if 'file' not in request.files:
-        return jsonify({"error": "В запросе отсутствует файл (file part)"}), 400
+        return None, (jsonify({"error": "В запросе отсутствует файл (file part)"}), 400)
     
     file = request.files['file']
     
     if file.filename == '':
-        return jsonify({"error": "Файл не выбран"}), 400
+        return None, (jsonify({"error": "Файл не выбран"}), 400)
     
-    # --- Проверка размера файла (лимит 10 МБ) ---
-    MAX_SIZE = 10 * 1024 * 1024  # 10 МБ
+    # --- Проверка размера файла (лимит задаётся MAX_UPLOAD_SIZE_MB) ---
+    max_size_mb = current_app.config['MAX_UPLOAD_SIZE_MB']
+    max_size = max_size_mb * 1024 * 1024
     content_length = request.content_length  # Может быть None
-    if content_length and content_length > MAX_SIZE:
-        return jsonify({"error": f"Размер файла превышает 10 МБ (получено ~{content_length / (1024*1024):.2f} МБ)"}), 400
+    if content_length and content_length > max_size:
+        return None, (jsonify({"error": f"Размер файла превышает {max_size_mb} МБ (получено ~{content_length / (1024*1024):.2f} МБ)"}), 400)
 
-    # Если заголовка Content-Length нет или нужно перепроверить, читаем ограниченно
-    # Создадим временный буфер из первых (MAX_SIZE + 1) байт, чтобы не читать гигантский файл целиком
+    # Если заголовка Content-Length нет, узнаём реальный размер без чтения файла в память
     if not content_length:
-        # Сохраняем позицию и читаем ограниченно
         pos = file.stream.tell()
-        head = file.stream.read(MAX_SIZE + 1)
-        if len(head) > MAX_SIZE:
-            return jsonify({"error": "Размер файла превышает 10 МБ"}), 400
-        # Возвращаемся в начало, чтобы pandas мог прочитать файл
+        file.stream.seek(0, os.SEEK_END)
+        size = file.stream.tell()
         file.stream.seek(pos)
+        if size > max_size:
+            return None, (jsonify({"error": f"Размер файла превышает {max_size_mb} МБ"}), 400)
 
-    if file and file.filename.endswith('.xlsx'):
-        try:
-            df = pd.read_excel(file, engine='openpyxl')
-
-            # --- Валидация ---
-            required_columns = ['question_id', 'question_text', 'answer_text']
-            if not all(col in df.columns for col in required_columns):
-                missing_cols = [col for col in required_columns if col not in df.columns]
-                return jsonify({"error": f"В файле отсутствуют необходимые колонки: {', '.join(missing_cols)}"}), 400
-
-            # Проверяем дубликаты question_id
-            duplicates = df[df.duplicated(subset=['question_id'], keep=False)]
-            if not duplicates.empty:
-                duplicate_ids = duplicates['question_id'].unique().tolist()
-                duplicate_rows = []
-                for dup_id in duplicate_ids:
-                    rows = df[df['question_id'] == dup_id].index.tolist()
-                    # +2 потому что pandas индексы с 0, а Excel строки с 1, плюс заголовок
-                    excel_rows = [row + 2 for row in rows]
-                    duplicate_rows.extend(excel_rows)
-                
-                return jsonify({
-                    'error': 'Обнаружены дубликаты question_id',
-                    'duplicate_question_ids': duplicate_ids,
-                    'duplicate_rows': sorted(duplicate_rows),
-                    'message': f'Дубликаты найдены в строках: {", ".join(map(str, sorted(duplicate_rows)))}'
-                }), 400
-            
-            # Проверяем наличие пустых значений в обязательных полях
-            empty_rows = []
-            for index, row in df.iterrows():
-                if pd.isna(row['question_id']) or pd.isna(row['question_text']) or pd.isna(row['answer_text']):
-                    empty_rows.append(index + 2)  # +2 для Excel нумерации
-            
-            if empty_rows:
-                return jsonify({
-                    'error': 'Обнаружены пустые значения в обязательных полях',
-                    'empty_rows': empty_rows,
-                    'message': f'Пустые значения в строках: {", ".join(map(str, empty_rows))}'
-                }), 400
-            
-            # Очищаем таблицы перед загрузкой новых данных
-            # Сначала чистим таблицу связей many-to-many, чтобы не нарушить внешние ключи
-            db.session.execute(question_categories.delete())
-            db.session.commit()
-            # Затем удаляем только вопросы (категории сохраняем)
-            Question.query.delete()
-            db.session.commit()
-
-            # --- Наполнение БД ---
-            questions_to_add = []
-            for index, row in df.iterrows():
-                # Определяем обязательные поля
-                question_id = int(row['question_id'])
-                question_text = str(row['question_text'])
-                answer_text = str(row['answer_text'])
-                topic = row.get('topic', '')  # Необязательное поле
-                
-                # Создаем словарь с дополнительными данными
-                # Исключаем обязательные поля
-                additional_data = row.drop(['question_id', 'question_text', 'answer_text']).to_dict()
-                
-                # Конвертируем Timestamp в строку, сохраняя исходный формат
-                for key, value in additional_data.items():
-                    if isinstance(value, pd.Timestamp):
-                        # Сохраняем исходный формат даты MM/d/yyyy
-                        additional_data[key] = value.strftime('%m/%d/%Y').lstrip('0').replace('/0', '/')
-                
-                new_question = Question(
-                    id=question_id,
-                    question_text=question_text,
-                    answer_text=answer_text,
-                    topic=topic,
-                    additional_data=additional_data
-                )
-                questions_to_add.append(new_question)
-            
-            db.session.bulk_save_objects(questions_to_add)
-            db.session.commit()
-            
-            added_count = len(questions_to_add)
-            updated_count = 0 # Логика обновления была удалена согласно требованию полной очистки
-            
-            return jsonify({
-                "message": "Файл успешно загружен.",
-                "summary": {
-                    "total_questions_processed": added_count
-                }
-            }), 200
-
-        except Exception as e:
-            db.session.rollback()
-            return jsonify({"error": f"Произошла ошибка при обработке файла: {str(e)}"}), 500
-    else:
-        return jsonify({"error": "Неподдерживаемый формат файла. Пожалуйста, загрузите .xlsx файл."}), 400
+    mode = request.values.get('mode', 'replace')
+    if mode not in UPLOAD_MODES:
+        return None, (jsonify({"error": f"Параметр 'mode' может принимать только значения: {', '.join(UPLOAD_MODES)}."}), 400)
+    delete_missing = request.values.get('delete_missing', 'false').lower() in ('1', 'true', 'yes')
+
+    if not file.filename.endswith('.xlsx'):
+        return None, (jsonify({"error": "Неподдерживаемый формат файла. Пожалуйста, загрузите .xlsx файл."}), 400)
+
+    return (file, mode, delete_missing), None
+
+
+@api.route('/api/upload', methods=['POST'])
+def upload_file():
+    """
+    Эндпоинт для загрузки и обработки .xlsx файла.
+    Файл читается потоково (openpyxl read-only) и пишется в БД пачками.
+    Параметры (form или query):
+        mode (str): 'replace' - полная замена (по умолчанию), 'merge' - слияние по question_id
+        delete_missing (bool): при mode=merge удалить вопросы, которых нет в файле
+    Для больших файлов - фоновый вариант POST /api/jobs/upload.
+    """
+    params, error = _parse_upload_request()
+    if error:
+        return error
+    file, mode, delete_missing = params
+
+    try:
+        # Загрузка идёт в теневую таблицу, живые данные меняются атомарно при коммите
+        summary = load_questions(file.stream, filename=file.filename,
+                                 chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'],
+                                 mode=mode, delete_missing=delete_missing)
+        notify('dataset_changed', mode=mode, summary=summary)
+        db.session.commit()
+        invalidate_stats()
+        
+        return jsonify({
+            "message": "Файл успешно загружен.",
+            "summary": summary
+        }), 200
+
+    except UploadValidationError as e:
+        db.session.rollback()
+        return jsonify(e.payload), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Произошла ошибка при обработке файла: {str(e)}"}), 500
+
+
+# Поля элемента списка вопросов; fields= выбирает подмножество
+LIST_FIELDS = ('id', 'question_text', 'answer_text', 'question_short', 'answer_short',
+               'topic', 'score', 'version', 'categories')
+
+# Длина сокращённых текстов question_short / answer_short
+SHORT_TEXT_LENGTH = 50
+
+# Максимальный размер страницы в курсорном режиме
+MAX_PAGE_SIZE = 500
+
+
+def _short_text(text):
+    return text[:SHORT_TEXT_LENGTH] + '...' if len(text) > SHORT_TEXT_LENGTH else text
+
+
+def _list_fields():
+    """
+    Поля из параметра fields (через запятую). Без параметра - все поля LIST_FIELDS.
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return LIST_FIELDS
+    requested = {name.strip() for name in fields.split(',')}
+    return tuple(name for name in LIST_FIELDS if name in requested) or ('id',)
+
+
+def _load_list_items(ids, fields):
+    """
+    Элементы списка вопросов по id с загрузкой только нужных колонок:
+    полные тексты - только если запрошены, для *_short без полного текста из БД берётся его начало.
+    """
+    if not ids:
+        return []
+    options = [db.defer(Question.additional_data), db.defer(Question.content_hash)]
+    for column, preview, full, short in (
+            (Question.question_text, Question.question_preview, 'question_text', 'question_short'),
+            (Question.answer_text, Question.answer_preview, 'answer_text', 'answer_short')):
+        if full not in fields:
+            options.append(db.defer(column))
+            if short in fields:
+                # Одного лишнего символа достаточно, чтобы понять, нужно ли многоточие
+                options.append(db.with_expression(preview, db.func.substr(column, 1, SHORT_TEXT_LENGTH + 1)))
+    if 'categories' not in fields:
+        options.append(db.noload(Question.categories))
+
+    questions = Question.query.options(*options).filter(Question.id.in_(ids)).order_by(Question.id).all()
+    return [_question_item(q, fields) for q in questions]
+
+
+def _question_item(q, fields=LIST_FIELDS):
+    """
+    Элемент списка вопросов для GET /api/questions.
+    """
+    item = {}
+    for name in fields:
+        if name == 'question_short':
+            item[name] = _short_text(q.question_text if 'question_text' in fields else q.question_preview)
+        elif name == 'answer_short':
+            item[name] = _short_text(q.answer_text if 'answer_text' in fields else q.answer_preview)
+        elif name == 'categories':
+            item[name] = [{'id': c.id, 'name': c.name} for c in q.categories]  # Полные объекты категорий
+        else:
+            item[name] = getattr(q, name)
+    return item
 
 
 @api.route('/api/questions', methods=['GET'])
@@ -145,56 +170,97 @@ def get_questions():
     Параметры:
         page (int): номер страницы (по умолчанию 1)
         filter (str): 'all', 'evaluated', 'unevaluated' (по умолчанию 'all')
+        q, topic, category_id, data.<ключ>: поиск и фильтры, см. apply_question_filters()
+        fields (str): поля элементов через запятую, например fields=id,question_short,score
+    Курсорный режим (включается параметром after_id или limit):
+        after_id (int): вернуть вопросы с id больше указанного (по умолчанию 0)
+        limit (int): размер страницы (по умолчанию 20, не больше MAX_PAGE_SIZE)
+        count (bool): считать ли общее количество (по умолчанию true)
+    Сначала выбираются только пары (id, version) страницы - по ним строится ETag.
+    Если данные не менялись, клиент с If-None-Match получает 304, а тексты и категории не читаются.
     """
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    filter_option = request.args.get('filter', 'all', type=str)
+    fields = _list_fields()
+    query = apply_question_filters(Question.query, request.args)
+    keys_query = query.with_entities(Question.id, Question.version).order_by(Question.id)
 
-    query = Question.query
-
-    if filter_option == 'evaluated':
-        query = query.filter(Question.score.isnot(None))
-    elif filter_option == 'unevaluated':
-        query = query.filter(Question.score.is_(None))
-
-    pagination = query.order_by(Question.id).paginate(page=page, per_page=per_page, error_out=False)
-    questions = pagination.items
-
-    result = []
-    for q in questions:
-        result.append({
-            'id': q.id,
-            'question_text': q.question_text,  # Полный текст вопроса
-            'answer_text': q.answer_text,      # Полный текст ответа
-            'question_short': q.question_text[:50] + '...' if len(q.question_text) > 50 else q.question_text,
-            'answer_short': q.answer_text[:50] + '...' if len(q.answer_text) > 50 else q.answer_text,
-            'topic': q.topic,
-            'score': q.score,
-            'categories': [{'id': c.id, 'name': c.name} for c in q.categories]  # Полные объекты категорий
-        })
+    if 'after_id' in request.args or 'limit' in request.args:
+        after_id = request.args.get('after_id', 0, type=int)
+        limit = max(1, min(request.args.get('limit', 20, type=int), MAX_PAGE_SIZE))
+        with_count = request.args.get('count', 'true').lower() not in ('0', 'false', 'no')
 
-    return jsonify({
-        'questions': result,
-        'total_pages': pagination.pages,
-        'current_page': pagination.page,
-        'has_next': pagination.has_next,
-        'has_prev': pagination.has_prev
+        # Берём на одну запись больше, чтобы узнать, есть ли следующая страница, без COUNT
+        keys = keys_query.filter(Question.id > after_id).limit(limit + 1).all()
+        has_next = len(keys) > limit
+        keys = keys[:limit]
+
+        meta = {
+            'next_cursor': keys[-1].id if has_next else None,
+            'has_next': has_next,
+            'limit': limit,
+        }
+        if with_count:
+            meta['total'] = query.order_by(None).count()
+    else:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = request.args.get('per_page', 20, type=int)
+        if per_page < 1:
+            per_page = 20
+
+        total = query.order_by(None).count()
+        keys = keys_query.offset((page - 1) * per_page).limit(per_page).all()
+        pages = -(-total // per_page)
+        meta = {
+            'total': total,
+            'total_pages': pages,
+            'current_page': page,
+            'has_next': page < pages,
+            'has_prev': page > 1,
+        }
+
+    etag = make_etag(sorted(request.args.items(multi=True)), meta, [tuple(key) for key in keys])
+    return cached_json(etag, lambda: {
+        'questions': _load_list_items([key.id for key in keys], fields),
+        **meta,
     })
 
 
+def _question_etag(question_id, version):
+    """
+    ETag вопроса: меняется при каждом изменении оценки или категорий.
+    """
+    return f'q{question_id}-v{version}'
+
+
+def _expected_version(question_id, data):
+    """
+    Ожидаемая клиентом версия вопроса: из заголовка If-Match (ETag) или поля 'version' в теле.
+    None - клиент версию не передал, проверка не нужна.
+    """
+    if request.if_match and not request.if_match.star_tag:
+        for etag in request.if_match.as_set():
+            match = re.fullmatch(r'q(\d+)-v(\d+)', etag)
+            if match and int(match.group(1)) == question_id:
+                return int(match.group(2))
+        return -1  # Ни один ETag не относится к этому вопросу - заведомый конфликт
+    version = data.get('version')
+    return version if isinstance(version, int) else None
+
+
 @api.route('/api/questions/<int:id>', methods=['GET'])
 def get_question_detail(id):
     """
     Эндпоинт для получения полной информации по одному вопросу.
+    ETag ответа используется в If-Match при обновлении (PUT) и в If-None-Match (304).
     """
     question = Question.query.get_or_404(id)
 
-    return jsonify({
+    return cached_json(_question_etag(question.id, question.version), lambda: {
         'id': question.id,
         'question_text': question.question_text,
         'answer_text': question.answer_text,
         'topic': question.topic,
         'score': question.score,
+        'version': question.version,
         'categories': [{'id': c.id, 'name': c.name} for c in question.categories],  # Полные объекты
         'additional_data': question.additional_data
     })
@@ -203,16 +269,20 @@ def get_question_detail(id):
 def update_question(id):
     """
     Эндпоинт для обновления оценки и категорий вопроса.
+    Оптимистическая блокировка: если передан If-Match (или 'version' в теле),
+    обновление выполняется условным UPDATE ... WHERE version = ?,
+    при несовпадении версии возвращается 409 без изменений.
     """
     question = Question.query.get_or_404(id)
     data = request.get_json()
+    values = {'version': Question.version + 1}
 
     if 'score' in data:
         # В ТЗ "Согласен / Не согласен". Будем считать 1 - да, 0 - нет.
         # None - оценка не выставлена.
         score_value = data['score']
         if score_value in [0, 1, None]:
-             question.score = score_value
+             values['score'] = score_value
         else:
             return jsonify({"error": "Поле 'score' может принимать только значения 0, 1 или null."}), 400
 
@@ -221,47 +291,119 @@ def update_question(id):
         category_ids = data['category_ids']
         if not isinstance(category_ids, list):
              return jsonify({"error": "Поле 'category_ids' должно быть списком."}), 400
-        
-        # Очищаем текущие категории и добавляем новые
-        question.categories.clear()
-        new_categories = Category.query.filter(Category.id.in_(category_ids)).all()
-        question.categories.extend(new_categories)
 
     try:
+        statement = db.update(Question).where(Question.id == id)
+        expected_version = _expected_version(id, data)
+        if expected_version is not None:
+            statement = statement.where(Question.version == expected_version)
+        # Новая версия и оценка - из БД (RETURNING), а не из загруженного ранее объекта:
+        # между чтением и UPDATE вопрос мог изменить другой пользователь
+        updated = db.session.execute(statement.values(**values).returning(Question.version, Question.score)).first()
+        if updated is None:
+            db.session.rollback()
+            current = db.session.get(Question, id)
+            response = jsonify({
+                "error": f"Вопрос с ID {id} был изменён другим пользователем. Обновите данные и повторите.",
+                "current_version": current.version if current else None
+            })
+            return response, 409
+
+        if 'category_ids' in data:
+            # Очищаем текущие категории и добавляем новые
+            question.categories.clear()
+            new_categories = Category.query.filter(Category.id.in_(category_ids)).all()
+            question.categories.extend(new_categories)
+
+        version, score = updated
+        categories = [{'id': c.id, 'name': c.name} for c in question.categories]  # Полные объекты
+        notify('question_updated', id=id, score=score, version=version,
+               category_ids=[c['id'] for c in categories])
         db.session.commit()
-        return jsonify({
+        invalidate_stats()
+        response = jsonify({
             "message": f"Вопрос с ID {id} успешно обновлен.",
             "question": {
-                "id": question.id,
-                "score": question.score,
-                "categories": [{'id': c.id, 'name': c.name} for c in question.categories]  # Полные объекты
+                "id": id,
+                "score": score,
+                "version": version,
+                "categories": categories
             }
-        }), 200
+        })
+        response.set_etag(_question_etag(id, version))
+        return response, 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Произошла ошибка при обновлении: {str(e)}"}), 500
 
 
+@api.route('/api/questions/batch', methods=['PUT'])
+def update_questions_batch():
+    """
+    Эндпоинт для пакетного обновления оценок и категорий.
+    Тело: {"updates": [{"id": 1, "score": 1, "category_ids": [1, 3], "version": 2}, ...]}
+    Поле version необязательно: если передано, при несовпадении версии элемент получает статус 'conflict'.
+    Обновлённые элементы возвращаются с новой версией (она же уходит в событие questions_updated).
+    Все изменения применяются в одной транзакции, результат - по каждому id.
+    """
+    data = request.get_json(silent=True) or {}
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not updates:
+        return jsonify({"error": "Поле 'updates' должно быть непустым списком."}), 400
+    if len(updates) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"В одном пакете допускается не более {MAX_BATCH_SIZE} изменений."}), 400
+
+    try:
+        results = apply_batch_update(updates)
+        updated = [result for result in results if result['status'] == 'updated']
+        if updated:
+            notify('questions_updated', questions=updated)
+        db.session.commit()
+        invalidate_stats()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Произошла ошибка при обновлении: {str(e)}"}), 500
+
+    return jsonify({
+        "message": f"Обновлено вопросов: {len(updated)} из {len(updates)}.",
+        "results": results
+    }), 200
+
+
 @api.route('/api/questions/stats', methods=['GET'])
 def get_questions_stats():
     """
     Эндпоинт для получения статистики по вопросам.
-    Возвращает общее количество, количество оцененных и неоцененных.
+    Возвращает общее количество, количество оцененных и неоцененных,
+    разбивку согласен/не согласен, по категориям и по темам.
+    Результат кэшируется на STATS_CACHE_TTL секунд и сбрасывается при изменении данных.
     """
     try:
-        total_count = Question.query.count()
-        evaluated_count = Question.query.filter(Question.score.isnot(None)).count()
-        unevaluated_count = total_count - evaluated_count
-        
-        return jsonify({
-            'total': total_count,
-            'evaluated': evaluated_count,
-            'unevaluated': unevaluated_count
-        })
+        return jsonify(get_stats(current_app.config['STATS_CACHE_TTL']))
     except Exception as e:
         return jsonify({"error": f"Ошибка получения статистики: {str(e)}"}), 500
 
 
+@api.route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    Поток Server-Sent Events об изменениях вопросов вместо опроса статистики и списка.
+    События: stats (снимок статистики - сразу и после изменений, не чаще EVENTS_STATS_INTERVAL сек),
+    question_updated, questions_updated, dataset_changed, resync (клиенту нужно перечитать данные).
+    На PostgreSQL события приходят из всех воркеров (LISTEN/NOTIFY), иначе - только из текущего процесса.
+    Каждый клиент занимает поток воркера, поэтому их число ограничено EVENTS_MAX_CLIENTS.
+    """
+    if broker.client_count >= current_app.config['EVENTS_MAX_CLIENTS']:
+        return jsonify({"error": "Слишком много подключений к потоку событий, попробуйте позже."}), 503
+
+    ensure_listener(current_app._get_current_object())
+    events = iter_events(current_app.config['STATS_CACHE_TTL'],
+                         current_app.config['EVENTS_HEARTBEAT'],
+                         current_app.config['EVENTS_STATS_INTERVAL'])
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @api.route('/api/categories', methods=['GET'])
 def get_categories():
     """
@@ -269,8 +411,8 @@ def get_categories():
     """
     categories = Category.query.all()
     result = [{"id": c.id, "name": c.name} for c in categories]
-    
-    return jsonify({"categories": result}), 200
+
+    return cached_json(make_etag(result), lambda: {"categories": result})
 
 
 @api.route('/api/export', methods=['GET'])
@@ -278,39 +420,102 @@ def export_results():
     """
     Эндпоинт для экспорта результатов оценки в Excel.
     Параметры:
-        format (str): 'excel' или 'csv' (по умолчанию 'excel')
+        format (str): 'excel', 'csv', 'parquet' или 'arrow' (по умолчанию 'excel');
+            parquet и arrow требуют pyarrow
+        columns (str): колонки экспорта через запятую (по умолчанию все)
         filter (str): 'all', 'evaluated', 'unevaluated' (по умолчанию 'all')
+        q, topic, category_id, data.<ключ>: поиск и фильтры, как в GET /api/questions
     """
     format_type = request.args.get('format', 'excel', type=str)
     filter_option = request.args.get('filter', 'all', type=str)
-    
+    if format_type in COLUMNAR_FORMATS and not columnar_available():
+        return jsonify({"error": f"Формат '{format_type}' недоступен: не установлен пакет pyarrow."}), 501
+
     # Фильтрация как в get_questions()
-    query = Question.query
-    if filter_option == 'evaluated':
-        query = query.filter(Question.score.isnot(None))
-    elif filter_option == 'unevaluated':
-        query = query.filter(Question.score.is_(None))
-    
-    questions = query.order_by(Question.id).all()
-    
-    # Подготовка данных для экспорта
-    data = []
-    for q in questions:
-        row = {
-            'question_id': q.id,
-            'question_text': q.question_text,
-            'answer_text': q.answer_text,
-            'score': q.score,
-            'score_text': 'Согласен' if q.score == 1 else ('Не согласен' if q.score == 0 else 'Не оценено'),
-            # 'categories': ', '.join([str(c.id) for c in q.categories]),
-            'categories': ' | '.join([c.name for c in q.categories]) if q.categories else '',  # Категории берём именами
-        }
-        # Добавляем дополнительные данные
-        if q.additional_data:
-            row.update(q.additional_data)
-        data.append(row)
-    
+    query = apply_question_filters(Question.query, request.args).order_by(Question.id)
+
+    # Строки читаются из БД пачками (yield_per), весь результат в памяти не собирается
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    columns = export_columns(query, batch_size=batch_size)
+    if request.args.get('columns'):
+        try:
+            columns = project_columns(columns, request.args['columns'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    if format_type in COLUMNAR_FORMATS:
+        # Из БД читаются только поля, нужные для выбранных колонок
+        return export_columnar(query, columns, format_type, filter_option, batch_size=batch_size)
+
+    rows = iter_export_rows(query, batch_size=batch_size)
+
     if format_type == 'csv':
-        return export_csv(data, filter_option)
+        return export_csv(rows, columns, filter_option)
     else:
-        return export_excel(data, filter_option)
+        return export_excel(rows, columns, filter_option)
+
+
+@api.route('/api/jobs/upload', methods=['POST'])
+def submit_upload_job():
+    """
+    Фоновая загрузка .xlsx. Параметры как у POST /api/upload.
+    Возвращает id задачи, статус - GET /api/jobs/<job_id>.
+    """
+    params, error = _parse_upload_request()
+    if error:
+        return error
+    file, mode, delete_missing = params
+
+    # Файл сохраняем на диск: задача выполняется уже после завершения запроса.
+    # Имя начинается с id задачи, чтобы файл удалялся и вместе с прерванной задачей
+    job_id = new_job_id()
+    path = os.path.join(jobs_dir(), f'{job_id}.upload.xlsx')
+    file.save(path)
+
+    job = submit_job('upload', run_upload_job, {'filename': file.filename, 'mode': mode, 'delete_missing': delete_missing},
+                     job_id=job_id, path=path, filename=file.filename, mode=mode, delete_missing=delete_missing)
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+
+@api.route('/api/jobs/export', methods=['POST'])
+def submit_export_job():
+    """
+    Фоновый экспорт. Параметры как у GET /api/export (format, filter и фильтры поиска).
+    Готовый файл - GET /api/jobs/<job_id>/download.
+    """
+    filters = request.values.to_dict()
+    format_type = filters.pop('format', 'excel')
+    if format_type not in EXPORT_EXTENSIONS:
+        return jsonify({"error": f"Параметр 'format' может принимать только значения: {', '.join(EXPORT_EXTENSIONS)}."}), 400
+    if format_type in COLUMNAR_FORMATS and not columnar_available():
+        return jsonify({"error": f"Формат '{format_type}' недоступен: не установлен пакет pyarrow."}), 501
+
+    job = submit_job('export', run_export_job, {'format': format_type, **filters},
+                     format_type=format_type, filters=filters)
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Эндпоинт для получения статуса и прогресса фоновой задачи.
+    Задача, воркер которой остановлен, отдаётся как failed.
+    """
+    fail_stale_jobs(job_id)
+    db.session.commit()
+    job = Job.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+
+@api.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_job_artifact(job_id):
+    """
+    Эндпоинт для скачивания результата завершённой задачи экспорта.
+    """
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'done' or not job.artifact_path:
+        return jsonify({"error": f"Результат задачи недоступен (статус: {job.status})."}), 409
+    if not os.path.exists(job.artifact_path):
+        return jsonify({"error": "Файл результата задачи не найден."}), 410
+
+    return send_file(job.artifact_path, as_attachment=True, download_name=job.artifact_name)
@@ -1,33 +1,89 @@
 import os
+import tempfile
+import time
+import click
 from dotenv import load_dotenv
 from flask import Flask
+from flask.cli import with_appcontext
 from flask_cors import CORS
+from sqlalchemy.exc import OperationalError
+from models import db, upgrade_schema
+from functions.database import configure_database
+from functions.metrics import init_metrics
 
-# Загружаем переменные окружения из .env файла
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-if os.path.exists(dotenv_path):
-    load_dotenv(dotenv_path)
 
-# Создаем Flask приложение
-app = Flask(__name__)
+def _configure(app):
+    """
+    Конфигурация приложения из переменных окружения.
+    """
+    # Загружаем переменные окружения из .env файла
+    dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+    if os.path.exists(dotenv_path):
+        load_dotenv(dotenv_path)
 
-# Конфигурация
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://user:password@db:5432/medical_eval')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://user:password@db:5432/medical_eval')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Пул соединений (кроме SQLite): размер, сверх пула, ожидание свободного соединения (сек),
+    # пересоздание соединений старше DB_POOL_RECYCLE сек, проверка соединения перед выдачей из пула
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    # statement_timeout PostgreSQL (мс, 0 - без ограничения) и переопределения для эндпоинтов,
+    # например DB_STATEMENT_TIMEOUTS=api.get_questions=5000,api.export_results=600000
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    app.config['DB_STATEMENT_TIMEOUTS'] = {
+        endpoint.strip(): int(timeout)
+        for endpoint, timeout in (item.split('=', 1) for item in os.environ.get('DB_STATEMENT_TIMEOUTS', '').split(',') if item.strip())
+    }
+    # Реплика для чтения и эндпоинты (GET), которые читают с неё
+    app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+    app.config['DB_REPLICA_ENDPOINTS'] = [
+        endpoint.strip() for endpoint in os.environ.get('DB_REPLICA_ENDPOINTS', 'api.get_questions,api.export_results').split(',')
+        if endpoint.strip()
+    ]
+    # Лимит размера загружаемого файла (МБ) и размер пачки строк при записи в БД
+    app.config['MAX_UPLOAD_SIZE_MB'] = int(os.environ.get('MAX_UPLOAD_SIZE_MB', 10))
+    app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 5000))
+    # Способ массовой записи: 'copy' (PostgreSQL) или 'executemany'; пусто - выбор по диалекту БД
+    app.config['BULK_LOADER'] = os.environ.get('BULK_LOADER')
+    # Размер пачки строк, читаемых из БД при экспорте
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    # Файлы экспорта больше этого размера (байт) пишутся во временный файл на диске, а не в память
+    app.config['EXPORT_SPOOL_MAX_SIZE'] = int(os.environ.get('EXPORT_SPOOL_MAX_SIZE', 16 * 1024 * 1024))
+    # Фоновые задачи: каталог для файлов, число потоков на воркер, сколько часов хранить результаты
+    app.config['JOBS_DIR'] = os.environ.get('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'medical_eval_jobs'))
+    app.config['JOBS_MAX_WORKERS'] = int(os.environ.get('JOBS_MAX_WORKERS', 2))
+    app.config['JOBS_RETENTION_HOURS'] = int(os.environ.get('JOBS_RETENTION_HOURS', 24))
+    # Как часто (сек) воркер отмечает свои задачи живыми и через сколько секунд без отметки
+    # задача считается прерванной (воркер перезапущен или убит)
+    app.config['JOBS_HEARTBEAT_INTERVAL'] = float(os.environ.get('JOBS_HEARTBEAT_INTERVAL', 30))
+    app.config['JOBS_STALE_AFTER'] = float(os.environ.get('JOBS_STALE_AFTER', 300))
+    # Сколько секунд кэшировать статистику по вопросам
+    app.config['STATS_CACHE_TTL'] = float(os.environ.get('STATS_CACHE_TTL', 5))
+    # HTTP-кэш GET-эндпоинтов: сколько готовых тел ответов держать в памяти воркера
+    # и с какого размера (байт) сжимать JSON (gzip, br - если установлен пакет brotli)
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    # Поток событий /api/events: максимум клиентов на воркер (каждый занимает поток),
+    # интервал heartbeat и минимальный интервал между снимками статистики (сек)
+    app.config['EVENTS_MAX_CLIENTS'] = int(os.environ.get('EVENTS_MAX_CLIENTS', 8))
+    app.config['EVENTS_HEARTBEAT'] = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+    app.config['EVENTS_STATS_INTERVAL'] = float(os.environ.get('EVENTS_STATS_INTERVAL', 1))
+    # Профилирование медленных запросов: порог (мс, 0 - выключено) и каталог для профилей cProfile
+    app.config['PROFILE_SLOW_REQUESTS_MS'] = float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0))
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'medical_eval_profiles'))
 
-# Импорт и инициализация db из models
-from models import db
-db.init_app(app)
 
-# Инициализация CORS
-CORS(app, resources={r"/*": {"origins": "*"}})
-
-# Импорт роутов после инициализации db
-import routes
-
-# Создание таблиц в БД при запуске
-with app.app_context():
-    db.create_all()
+def init_db():
+    """
+    Создание таблиц, обновление схемы и seed базовых категорий.
+    Выполняется один раз при развёртывании (flask init-db), а не при старте каждого воркера.
+    """
+    # Только основная БД: реплика получает схему через репликацию
+    db.create_all(bind_key=None)
+    upgrade_schema()
     # --- Автосоздание (seed) базовых категорий при первом запуске ---
     try:
         from models import Category
@@ -42,21 +98,77 @@ with app.app_context():
             db.session.commit()
             print('[INIT] Добавлены базовые категории (1-4).')
     except Exception as se:
-        # Не прерываем запуск приложения, просто выводим сообщение
+        # Не прерываем инициализацию, просто выводим сообщение
         print(f'[WARN] Не удалось выполнить сидирование категорий: {se}')
 
-# Регистрация blueprint
-app.register_blueprint(routes.api)
 
-@app.route('/health')
+@click.command('init-db')
+@click.option('--wait', default=30, show_default=True, help='Сколько секунд ждать готовности БД.')
+@with_appcontext
+def init_db_command(wait):
+    """
+    Создание и обновление схемы БД и seed категорий.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            with db.engine.connect():
+                break
+        except OperationalError as e:
+            if time.monotonic() >= deadline:
+                raise click.ClickException(f'БД недоступна: {e}')
+            click.echo('[INIT] Ожидание БД...')
+            time.sleep(1)
+    init_db()
+    click.echo('[INIT] Схема БД готова.')
+
+
 def health_check():
     return "Backend is healthy and running!"
 
-@app.after_request
+
 def after_request(response):
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    # ETag нужен фронтенду для If-Match / If-None-Match
+    response.headers.add('Access-Control-Expose-Headers', 'ETag')
     return response
 
+
+def create_app(config=None):
+    """
+    Фабрика приложения. При создании к БД не обращается:
+    схема и seed категорий - отдельной командой flask init-db.
+    config - словарь, переопределяющий значения из окружения.
+    """
+    app = Flask(__name__)
+    _configure(app)
+    if config:
+        app.config.update(config)
+
+    configure_database(app)
+    db.init_app(app)
+
+    # Инициализация CORS
+    CORS(app, resources={r"/*": {"origins": "*"}})
+
+    # Импорт роутов после инициализации db
+    import routes
+    app.register_blueprint(routes.api)
+    app.add_url_rule('/health', 'health_check', health_check)
+
+    # Метрики запросов и SQL, эндпоинт /metrics
+    init_metrics(app)
+    app.after_request(after_request)
+
+    app.cli.add_command(init_db_command)
+    return app
+
+
+# Приложение для gunicorn (run:app) и flask CLI
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    with app.app_context():
+        init_db()
+    app.run(host='0.0.0.0', port=5001, debug=True)
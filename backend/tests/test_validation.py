@@ -0,0 +1,36 @@
+from datetime import datetime
+from functions.validation import RowValidator
+
+COLUMNS = ['question_id', 'question_text', 'answer_text', 'updated_by', 'candidate_answer', 'visit_date']
+
+
+def _row(question_id, **values):
+    record = dict.fromkeys(COLUMNS)
+    record.update(question_id=question_id, question_text='Вопрос', answer_text='Ответ', **values)
+    return record
+
+
+def test_column_with_date_inside_name_is_not_a_date_column():
+    validator = RowValidator(COLUMNS)
+    assert validator.check(2, _row(1, updated_by='Иванов', candidate_answer='B')) == 1
+    assert validator.check(3, _row(2, updated_by='Петров', candidate_answer='C')) == 2
+    assert not validator.has_errors
+
+
+def test_text_in_date_named_column_without_date_cells_is_accepted():
+    validator = RowValidator(COLUMNS)
+    validator.check(2, _row(1, visit_date='нет данных'))
+    validator.check(3, _row(2, visit_date='1/2/2024'))
+    assert not validator.has_errors
+
+
+def test_invalid_values_in_date_column_are_reported():
+    validator = RowValidator(COLUMNS)
+    validator.check(2, _row(1, visit_date='вчера'))
+    validator.check(3, _row(2, visit_date=datetime(2024, 1, 2)))
+    validator.check(4, _row(3, visit_date='завтра'))
+    errors = validator.report()['errors']
+    assert [(error['row'], error['column'], error['code']) for error in errors] == [
+        (2, 'visit_date', 'invalid_date'),
+        (4, 'visit_date', 'invalid_date'),
+    ]